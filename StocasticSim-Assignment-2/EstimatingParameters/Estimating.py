@@ -1,35 +1,110 @@
+import os
+import sys
+
+import numpy as np
 import pandas as pd
 
-def estimateParameters():
-    df = pd.read_excel(r'C:\Users\20203453\Documents\GitHub\StocasticSim-Assignment-2\arrivals5.xlsx', header = None)
-    df.columns = [0,1]
-    lane0 = df[0].tolist()
-    lane1 = df[1].tolist()
-    B = 1
-    alpha = []
-    mu = []
-    for i in range(2):
-        lanes = [lane0, lane0]
-        lane = lanes[i]
-        proportion =[0,0]       #[greater then 1, less then 1]
-        sumOfIntArr = []
-        time1 = 0    # initialize value for the arrival time of the first car
-        time2 = lane.pop(0)     # initialize value for the arrival time of the second car
-        while len(lane) > 0:
-            if time2 - time1 > B: # Check if the interarrival time is > or <= to B
-                proportion[0] += 1
-            else:
-                proportion[1] += 1
-            sumOfIntArr.append(time2 - time1)
-            time1, time2 = time2, lane.pop(0) # Update the arrival times, such that we can look at the next interarrival time.
-        a = proportion[0] / sum(proportion)
-        mean = sum(sumOfIntArr) / len(sumOfIntArr)
-        m = a / (mean-a*B)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # for the FCFS package, when run as a script
+from FCFS.ArrivalData import DEFAULT_PATH, loadArrivals
+
+
+class LaneStatistics:
+    """Sufficient statistics of the interarrival times X of one lane, for fitting the
+    bunched exponential distribution: X = B with probability 1-alpha, else X = B + Exp(mu).
+
+    Arrival times are added in chunks with add(); the first interarrival time is
+    measured from start. Statistics of different traces (other days, other files,
+    processed in parallel) are combined with merge(). Only sums are kept, so the
+    memory does not depend on the length of the traces."""
+
+    def __init__(self, B=1, start=0.0, tol=1e-9):
+        self.B = B
+        self.tol = tol              # an interarrival time of at most B + tol is bunched
+        self.last = start           # last arrival time that was added
+        self.n = 0                  # number of interarrival times
+        self.k = 0                  # number of them that are not bunched
+        self.sumFree = 0.0          # sum of X - B over the ones that are not bunched
+        self.sums = np.zeros(4)     # sums of Y, Y^2, Y^3 and Y^4 with Y = X - B, for the moments
+
+    def add(self, times):
+        times = np.asarray(times, dtype=float)
+        if len(times) == 0:
+            return
+        Y = np.maximum(np.diff(times, prepend=self.last) - self.B, 0.0)
+        self.last = float(times[-1])
+        free = Y > self.tol
+        self.n += len(Y)
+        self.k += int(free.sum())
+        self.sumFree += float(Y[free].sum())
+        power = Y.copy()
+        for i in range(4):
+            self.sums[i] += power.sum()
+            power *= Y
+
+    def merge(self, other):
+        self.n += other.n
+        self.k += other.k
+        self.sumFree += other.sumFree
+        self.sums += other.sums
+        return self
+
+    def mle(self):
+        """Maximum likelihood estimates (alpha, mu) and their standard errors (seAlpha, seMu)"""
+        alpha = self.k / self.n
+        mu = self.k / self.sumFree
+        return alpha, mu, np.sqrt(alpha * (1 - alpha) / self.n), mu / np.sqrt(self.k)
+
+    def moments(self):
+        """Method of moments estimates (alpha, mu) and their standard errors (seAlpha, seMu).
+
+        With Y = X - B, E[Y] = alpha/mu and E[Y^2] = 2 alpha/mu^2, so mu = 2 E[Y]/E[Y^2]
+        and alpha = 2 E[Y]^2/E[Y^2]. This does not need to tell bunched and free
+        interarrival times apart. The standard errors follow with the delta method."""
+        m1, m2, m3, m4 = self.sums / self.n
+        alpha = 2 * m1**2 / m2
+        mu = 2 * m1 / m2
+        cov = np.array([[m2 - m1**2, m3 - m1 * m2], [m3 - m1 * m2, m4 - m2**2]]) / self.n
+        gradAlpha = np.array([4 * m1 / m2, -2 * m1**2 / m2**2])
+        gradMu = np.array([2 / m2, -2 * m1 / m2**2])
+        return alpha, mu, np.sqrt(gradAlpha @ cov @ gradAlpha), np.sqrt(gradMu @ cov @ gradMu)
+
+
+def fitLanes(arrivals, B=1, chunkSize=1 << 20):
+    """LaneStatistics of every lane, given the arrival times of the lanes (lists or arrays).
+    The lanes are read in chunks of chunkSize, so memory-mapped arrays, as returned by
+    loadArrivals, are never read into memory completely."""
+    stats = []
+    for times in arrivals:
+        s = LaneStatistics(B)
+        for i in range(0, len(times), chunkSize):
+            s.add(times[i:i + chunkSize])
+        stats.append(s)
+    return stats
+
+
+def fitCSVChunks(path, B=1, chunkSize=1 << 20):
+    """LaneStatistics of every lane (column) of a CSV file that is too large for memory,
+    read chunkSize rows at a time"""
+    stats = None
+    for df in pd.read_csv(path, header=None, chunksize=chunkSize):
+        if stats is None:
+            stats = [LaneStatistics(B) for _ in df.columns]
+        for s, column in zip(stats, df.columns):
+            s.add(pd.to_numeric(df[column], errors='coerce').dropna().to_numpy())
+    return stats
+
+
+def estimateParameters(path=DEFAULT_PATH, B=1, method='mle'):
+    """Estimates of alpha and mu for every lane of the arrival data in path ('mle' or 'moments')"""
+    alpha, mu = [], []
+    for s in fitLanes(loadArrivals(path), B):
+        a, m, _, _ = s.mle() if method == 'mle' else s.moments()
         alpha.append(a)
         mu.append(m)
-        print(f'alpha {i} = {a}')
-        print(f'mean of interarrival time of lane {i} = {mean}')
-        print(f'mu {i} = {a / (mean-a*B)} ')
     return alpha, mu
 
-estimateParameters()
+
+if __name__ == '__main__':
+    for i, s in enumerate(fitLanes(loadArrivals())):
+        for method, (a, m, seA, seM) in [('MLE', s.mle()), ('moments', s.moments())]:
+            print(f'lane {i} ({method}): alpha = {a:.4f} (se {seA:.4f}), mu = {m:.4f} (se {seM:.4f})')
@@ -0,0 +1,86 @@
+import glob
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# the arrival data of the assignment, next to the FCFS folder; the environment variable ARRIVALS_DATA overrides it
+DEFAULT_PATH = os.environ.get('ARRIVALS_DATA',
+                              os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'arrivals5.xlsx'))
+
+
+def fileHash(path, chunkSize=1 << 20):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunkSize), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def parseArrivals(path):
+    """Arrival times per lane (one column per lane, no header) of an Excel or CSV file.
+    Empty cells and text, like a header row, are skipped, so lanes can have different lengths."""
+    if path.lower().endswith(('.xlsx', '.xls')):
+        df = pd.read_excel(path, header=None)
+    else:
+        df = pd.read_csv(path, header=None)
+    return [pd.to_numeric(df[column], errors='coerce').dropna().to_numpy(dtype=float) for column in df.columns]
+
+
+def cachePaths(path):
+    root, _ = os.path.splitext(path)
+    return root + '.cache.json', root + '.lane{}.npy'
+
+
+def loadFile(path, mmap=True, refresh=False):
+    """Arrival times per lane of one file, from the .npy cache next to it if the cache is up to date.
+
+    The cache is valid if the modification time and size of the file are the ones it was made
+    for, or else if the SHA-256 hash of the file still is the same (then only the stored
+    modification time is updated). Otherwise, or with refresh=True, the file is parsed again."""
+    metaPath, lanePath = cachePaths(path)
+    stat = os.stat(path)
+    meta = None
+    if not refresh and os.path.exists(metaPath):
+        with open(metaPath) as f:
+            meta = json.load(f)
+        if not all(os.path.exists(lanePath.format(lane)) for lane in range(meta['nrLanes'])):
+            meta = None
+        elif meta['mtime'] != stat.st_mtime or meta['size'] != stat.st_size:
+            if meta['sha256'] == fileHash(path):
+                meta['mtime'], meta['size'] = stat.st_mtime, stat.st_size
+                with open(metaPath, 'w') as f:
+                    json.dump(meta, f)
+            else:
+                meta = None
+    if meta is None:
+        lanes = parseArrivals(path)
+        for lane, times in enumerate(lanes):
+            np.save(lanePath.format(lane), times)
+        meta = {'mtime': stat.st_mtime, 'size': stat.st_size, 'sha256': fileHash(path), 'nrLanes': len(lanes)}
+        with open(metaPath, 'w') as f:
+            json.dump(meta, f)
+    return [np.load(lanePath.format(lane), mmap_mode='r' if mmap else None) for lane in range(meta['nrLanes'])]
+
+
+def loadArrivals(path=DEFAULT_PATH, mmap=True, refresh=False):
+    """Arrival times of every lane as arrays, read from an Excel workbook or CSV file.
+
+    path can also be a list of files or a glob pattern, like 'data/lane*.csv', for a
+    trace set of several files; the lanes of the files are put after each other (in
+    sorted order for a pattern). Every file is only parsed the first time: its lanes
+    are cached as .npy files next to it, which are memory-mapped (read-only) with mmap=True.
+    Use TraceReplay (or list(...)) to get arrival times that can be changed."""
+    if isinstance(path, (str, os.PathLike)):
+        path = os.fspath(path)
+        paths = sorted(glob.glob(path)) if glob.has_magic(path) else [path]
+        if not paths:
+            raise FileNotFoundError(f'No arrival data matches {path}')
+    else:
+        paths = [os.fspath(p) for p in path]
+    lanes = []
+    for p in paths:
+        lanes.extend(loadFile(p, mmap, refresh))
+    return lanes
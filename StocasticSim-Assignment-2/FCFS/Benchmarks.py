@@ -0,0 +1,209 @@
+"""Benchmarks of the simulation hot paths.
+
+    python Benchmarks.py run results.json [--quick]
+    python Benchmarks.py compare baseline.json results.json [--tolerance 0.1]
+
+run measures the event rate (and the peak traced memory) of whole runs for several
+horizons, lane counts, loads and policies, the event rate for 2 to 256 lanes, plus micro-benchmarks of the sampler,
+the FES, the results accumulators and the trajectory computations, all with fixed
+seeds, and writes them to a JSON file. compare lists every measurement that got
+worse than the baseline by more than the tolerance and exits with 1 if there is one."""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from BunchedExponential import BunchedExp, BunchedExpSampler
+from Exhaustive_Simulation import EXHSimulation
+from FCFSSimulation import FCFSSimulation
+from FESBenchmark import benchmarkFES
+from IntersectionSimulation import IntersectionSimulation
+from Policies import FCFSPolicy, ExhaustivePolicy, GatedPolicy
+from SimResults import SimResults, StreamingSimResults
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # for the Trajectories package
+from Trajectories.trajectory import Trajectory, trajectory_times
+
+# name of a measurement -> True if higher is better
+HIGHER_IS_BETTER = {'eventsPerSec': True, 'perSec': True, 'peakMemoryMiB': False}
+
+SIM_CLASSES = {'FCFS': FCFSSimulation, 'exhaustive': EXHSimulation}
+POLICIES = {'FCFS': FCFSPolicy, 'exhaustive': ExhaustivePolicy, 'gated': GatedPolicy}
+
+
+def parameters(nrLanes, load, alpha=0.6, B=1):
+    """alpha and mu of every lane for a total load (arrival rate times B, over all lanes)"""
+    rate = load / (nrLanes * B)             # arrival rate of every lane, the mean interarrival time is B + alpha/mu
+    return [alpha] * nrLanes, [alpha / (1 / rate - B)] * nrLanes
+
+
+def bestOf(repeat, function):
+    """Smallest wall time of repeat calls of function"""
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def simulationBenchmark(policy, T, nrLanes, load, fast=False, memory=False, seed=1):
+    alpha, mu = parameters(nrLanes, load)
+
+    def run():
+        sim = SIM_CLASSES[policy](BunchedExpSampler(seed=seed), nrLanes, False, alpha, mu)
+        res = StreamingSimResults(nrLanes)
+        sim.simulate_fast(T, res) if fast else sim.simulate(T, res)
+        return res
+
+    nrEvents = sum(run().nQ)                            # every event registers one queue length
+    repeat = 5 if T <= 1e4 else 1                       # short runs are noisy, take the best of a few
+    result = {'eventsPerSec': nrEvents / bestOf(repeat, run)}
+    if memory:
+        tracemalloc.start()
+        run()
+        result['peakMemoryMiB'] = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    return result
+
+
+def laneScalingBenchmark(policy, nrLanes, T=40000, load=0.8, seed=1):
+    """Event rate of a run with nrLanes lanes that share a total load; with the heap and
+    bitset lane selection the rate should hardly depend on nrLanes (for short runs the
+    set-up per lane, such as the first block of the sampler, does count)"""
+    alpha, mu = parameters(nrLanes, load)
+
+    def run():
+        sim = IntersectionSimulation(BunchedExpSampler(seed=seed), nrLanes, False, alpha, mu, POLICIES[policy]())
+        res = StreamingSimResults(nrLanes)
+        sim.simulate(T, res)
+        return res
+
+    nrEvents = sum(run().nQ)
+    return {'eventsPerSec': nrEvents / bestOf(3, run)}
+
+
+def samplerBenchmarks(n=200000, seed=1, repeat=3):
+    rng = np.random.default_rng(seed)
+    result = {'BunchedExp': {'perSec': n / 10 / bestOf(repeat, lambda: [BunchedExp(0.6, 0.3, rng=rng) for _ in range(n // 10)])}}
+
+    def sample():
+        sampler = BunchedExpSampler(0.6, 0.3, seed=seed)
+        for _ in range(n):
+            sampler.sample(0)
+    result['BunchedExpSampler.sample'] = {'perSec': n / bestOf(repeat, sample)}
+    result['BunchedExpSampler.arrivalsUntil'] = {
+        'perSec': n / bestOf(repeat, lambda: BunchedExpSampler(0.6, 0.3, seed=seed).arrivalsUntil(0, n * 1.5))}
+    return result
+
+
+def resultsBenchmarks(n=100000, seed=1, repeat=3):
+    rng = np.random.default_rng(seed)
+    times = np.cumsum(rng.exponential(1.0, n)).tolist()
+    qls = rng.integers(0, 50, n).tolist()
+    ws = rng.exponential(5.0, n).tolist()
+    result = {}
+    for name, resClass in [('SimResults', SimResults), ('StreamingSimResults', StreamingSimResults)]:
+        def register():
+            res = resClass(1)
+            for t, ql, w in zip(times, qls, ws):
+                res.registerQueueLength(t, ql, 0)
+                res.registerWaitingTime(w, 0)
+        result[name + '.register'] = {'perSec': n / bestOf(repeat, register)}
+    return result
+
+
+def trajectoryBenchmarks(n=20000, seed=1, repeat=3):
+    rng = np.random.default_rng(seed)
+    arrival = np.cumsum(rng.exponential(3.0, n))
+    service = np.maximum.accumulate(arrival + rng.exponential(2.0, n)) + np.arange(n) * 1e-6
+
+    def loop():
+        t_full_y, t_f_y = -100, -100
+        for a, s in zip(arrival.tolist(), service.tolist()):
+            times = Trajectory(a, s, t_full_y, t_f_y).calculate_trajectory_times()
+            t_full_y, t_f_y = times[4], times[5]
+    return {'Trajectory.calculate_trajectory_times': {'perSec': n / bestOf(repeat, loop)},
+            'trajectory_times': {'perSec': n / bestOf(repeat, lambda: trajectory_times(arrival, service))}}
+
+
+def runAll(quick=False):
+    horizons = [1e3, 1e4] if quick else [1e3, 1e4, 1e5, 1e6]
+    results = {}
+    for policy in SIM_CLASSES:
+        for T in horizons:
+            for nrLanes in [2, 4]:
+                for load in [0.5, 0.8]:
+                    name = f'simulate/{policy}/T={T:g}/lanes={nrLanes}/load={load}'
+                    results[name] = simulationBenchmark(policy, T, nrLanes, load, memory=T <= 1e5)
+                    print(name, results[name], flush=True)
+    for policy in POLICIES:
+        for nrLanes in ([2, 16, 256] if quick else [2, 4, 8, 16, 32, 64, 128, 256]):
+            name = f'lanes/{policy}/L={nrLanes}'
+            results[name] = laneScalingBenchmark(policy, nrLanes, T=20000 if quick else 40000)
+            print(name, results[name], flush=True)
+    for T in horizons:
+        name = f'simulate_fast/FCFS/T={T:g}/lanes=2/load=0.8'
+        results[name] = simulationBenchmark('FCFS', T, 2, 0.8, fast=True, memory=True)
+        print(name, results[name], flush=True)
+    for queueSize in [4, 100, 10000]:
+        for fesName, rate in benchmarkFES(nrEvents=50000 if quick else 200000, queueSize=queueSize).items():
+            results[f'{fesName}/size={queueSize}'] = {'perSec': rate}
+    results.update(samplerBenchmarks(n=50000 if quick else 200000))
+    results.update(resultsBenchmarks(n=20000 if quick else 100000))
+    results.update(trajectoryBenchmarks(n=5000 if quick else 20000))
+    return results
+
+
+def compare(baseline, current, tolerance=0.1):
+    """Measurements that are worse than in the baseline by more than tolerance (relative),
+    as a list of (name, metric, baseline value, current value)"""
+    regressions = []
+    for name, metrics in current['results'].items():
+        for metric, value in metrics.items():
+            old = baseline['results'].get(name, {}).get(metric)
+            if old is None or old == 0:
+                continue
+            change = (value - old) / old
+            if (change < -tolerance) if HIGHER_IS_BETTER[metric] else (change > tolerance):
+                regressions.append((name, metric, old, value))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks of the simulation hot paths')
+    commands = parser.add_subparsers(dest='command', required=True)
+    run = commands.add_parser('run', help='run the benchmarks and write the results as JSON')
+    run.add_argument('output')
+    run.add_argument('--quick', action='store_true', help='short horizons and small micro-benchmarks')
+    comp = commands.add_parser('compare', help='flag regressions against a baseline')
+    comp.add_argument('baseline')
+    comp.add_argument('current')
+    comp.add_argument('--tolerance', type=float, default=0.1)
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        results = {'meta': {'date': time.strftime('%Y-%m-%d %H:%M:%S'), 'python': platform.python_version(),
+                            'numpy': np.__version__, 'machine': platform.platform(), 'quick': args.quick},
+                   'results': runAll(args.quick)}
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1)
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    regressions = compare(baseline, current, args.tolerance)
+    for name, metric, old, new in regressions:
+        print(f'REGRESSION {name} {metric}: {old:,.2f} -> {new:,.2f} ({100 * (new - old) / old:+.1f}%)')
+    print(f'{len(regressions)} regression(s) with a tolerance of {100 * args.tolerance:.0f}%')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
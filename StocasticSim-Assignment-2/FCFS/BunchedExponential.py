@@ -5,16 +5,130 @@ import pandas as pd
 
 import matplotlib.pyplot as plt
 
-def BunchedExp(alpha, mu, B=1):
+def BunchedExp(alpha, mu, B=1, rng=None):
     """Sample n times from the bunched exponential distribution"""
-    rng = random.default_rng()
+    if rng is None:
+        rng = random.default_rng()
     U = rng.uniform(0,1)
     if U < (1-alpha):
         return B
     else:
         output = (np.log(alpha)-np.log(-U+1)) / mu + B
-        return output 
-        
+        return output
+
+
+def inverseBunchedExp(U, alpha, mu, B=1):
+    """Inverse CDF of the bunched exponential distribution, applied to an array of uniforms"""
+    U = np.asarray(U, dtype=float)
+    tail = (np.log(alpha) - np.log1p(-U)) / mu + B
+    return np.where(U < 1 - alpha, B, tail)
+
+
+class BunchedExpSampler:
+    """Seedable sampler for bunched exponential interarrival times.
+
+    Every lane has its own (alpha, mu, B) and its own random stream, spawned
+    from the seed, so the numbers a lane gets do not depend on how often the
+    other lanes are sampled. Samples are drawn in blocks of blockSize with the
+    inverse CDF and handed out one by one; a new block is drawn when a block
+    runs out.
+
+    With antithetic=True every uniform U is replaced by 1-U: a run with the
+    same seed then gives the antithetic run, negatively correlated with the
+    normal one.
+
+    The seed (None, an int, a SeedSequence or a Generator) is turned into a fixed
+    SeedSequence once, so reset() always starts the lanes with the same streams;
+    for None or a Generator these streams are drawn when the sampler is made.
+
+    The sampler can be passed to FCFSSimulation/EXHSimulation as arrDist. The
+    alpha and mu given to the simulation are then used for the lanes."""
+
+    def __init__(self, alpha=None, mu=None, B=1, seed=None, blockSize=4096, antithetic=False):
+        self.seed = self.fixSeed(seed)
+        self.blockSize = blockSize
+        self.antithetic = antithetic    # use 1-U instead of U, for the antithetic run of a pair
+        self.nrLanes = 0
+        if alpha is not None:
+            self.setParameters(alpha, mu, B)
+
+    def setParameters(self, alpha, mu, B=1):
+        """Set the per-lane parameters, this (re)starts the random streams"""
+        self.alpha = np.atleast_1d(np.asarray(alpha, dtype=float))
+        self.mu = np.broadcast_to(np.asarray(mu, dtype=float), self.alpha.shape).copy()
+        self.B = np.broadcast_to(np.asarray(B, dtype=float), self.alpha.shape).copy()
+        self.nrLanes = len(self.alpha)
+        self.reset()
+
+    @staticmethod
+    def fixSeed(seed):
+        """The SeedSequence of a seed; a Generator gives one SeedSequence spawned from it"""
+        if isinstance(seed, np.random.SeedSequence):
+            return seed
+        if isinstance(seed, np.random.Generator):
+            return seed.bit_generator.seed_seq.spawn(1)[0]
+        return np.random.SeedSequence(seed)
+
+    def reset(self, seed=None):
+        """Start all lanes again from the seed (or from a new seed, if given)"""
+        if seed is not None:
+            self.seed = self.fixSeed(seed)
+        # spawn from a copy: spawn changes a SeedSequence and the lanes should get the same streams every time
+        seedSeq = np.random.SeedSequence(self.seed.entropy, spawn_key=self.seed.spawn_key, pool_size=self.seed.pool_size)
+        self.rngs = [random.default_rng(s) for s in seedSeq.spawn(self.nrLanes)]
+        self.arrays = [np.empty(0) for _ in range(self.nrLanes)]  # pre-drawn samples
+        self.blocks = [[] for _ in range(self.nrLanes)]           # the same samples as python floats
+        self.pos = [0] * self.nrLanes                             # position of the next sample in the block
+
+    def refill(self, lane):
+        """Draw a fresh block of blockSize interarrival times for this lane"""
+        U = self.rngs[lane].random(self.blockSize)
+        if self.antithetic:
+            U = (1 - 2**-53) - U    # 1-U, shifted to [0, 1) like U itself so the inverse CDF stays finite
+        self.arrays[lane] = inverseBunchedExp(U, self.alpha[lane], self.mu[lane], self.B[lane])
+        self.blocks[lane] = self.arrays[lane].tolist()
+        self.pos[lane] = 0
+
+    def sample(self, lane):
+        """Next interarrival time of a lane"""
+        pos = self.pos[lane]
+        if pos == len(self.blocks[lane]):
+            self.refill(lane)
+            pos = 0
+        self.pos[lane] = pos + 1
+        return self.blocks[lane][pos]
+
+    def sampleMany(self, lane, n):
+        """Next n interarrival times of a lane as an array, the same numbers as n calls to sample"""
+        parts = []
+        while n > 0:
+            if self.pos[lane] == len(self.blocks[lane]):
+                self.refill(lane)
+            part = self.arrays[lane][self.pos[lane]:self.pos[lane] + n]
+            self.pos[lane] += len(part)
+            parts.append(part)
+            n -= len(part)
+        return np.concatenate(parts) if parts else np.empty(0)
+
+    def nextArrival(self, lane, t):
+        """Arrival time of the next car of a lane, given the arrival time t of the previous one"""
+        return t + self.sample(lane)
+
+    def arrivalsUntil(self, lane, T, t=0):
+        """All arrival times of a lane after t, up to and including the first one at or after T.
+        The times are accumulated one by one, so they are exactly the times nextArrival gives."""
+        parts = []
+        while t < T:
+            if self.pos[lane] == len(self.blocks[lane]):
+                self.refill(lane)
+            rest = self.arrays[lane][self.pos[lane]:]
+            arrivals = np.cumsum(np.concatenate(([t], rest)))[1:]
+            k = min(np.searchsorted(arrivals, T, side='left'), len(arrivals) - 1)  # first arrival >= T
+            self.pos[lane] += k + 1
+            parts.append(arrivals[:k + 1])
+            t = arrivals[k]
+        return np.concatenate(parts) if parts else np.empty(0)
+
 
 # l = [BunchedExp(0.6,0.3) for _ in range(1000)]   # Check the function by plotting a density plot. 
 # l= np.cumsum(l)
@@ -0,0 +1,72 @@
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import os
+
+import numpy as np
+
+from Exhaustive_Simulation import EXHSimulation
+from FCFSSimulation import FCFSSimulation
+from OutputAnalysis import confidenceInterval
+from Replications import runReplication
+
+
+def runPair(simClasses, nrLanes, T, alpha, mu, arrivals, seed, crn, antithetic):
+    """One replication of every simulation class. With crn=True all classes get the same
+    seed, so the same arrivals (common random numbers), else every class gets its own stream.
+    With antithetic=True every class also does the antithetic run (1-U) and the two runs
+    are averaged. Returns arrays (class x lane) of the mean waiting times and queue lengths."""
+    seeds = [seed] * len(simClasses) if crn else seed.spawn(len(simClasses))
+    W, QL = [], []
+    for simClass, s in zip(simClasses, seeds):
+        runs = [runReplication(simClass, nrLanes, T, alpha, mu, arrivals, s, anti) for anti in ([False, True] if antithetic else [False])]
+        W.append(np.mean([w for w, _ in runs], axis=0))
+        QL.append(np.mean([ql for _, ql in runs], axis=0))
+    return np.array(W), np.array(QL)
+
+
+def comparePolicies(nrLanes, T, n, alpha=None, mu=None, arrivals=None, simClasses=(FCFSSimulation, EXHSimulation),
+                    seed=None, crn=True, antithetic=False, maxWorkers=None):
+    """Perform n replications of length T of two simulation classes (FCFS and exhaustive by
+    default), on a process pool as runReplications does. Replication i of both classes uses the
+    i-th stream of SeedSequence(seed), so with crn=True the classes see the same arrivals and
+    the difference between them is estimated with much less noise. With antithetic=True a
+    replication is an antithetic pair, which is only possible with a BunchedExpSampler,
+    not with arrivals from data.
+
+    Returns (meanW, meanQL): arrays of shape (2, nrLanes, n), meanW[c][lane] holds the
+    mean waiting times of class c over the replications; see pairedDifferenceCI."""
+    if antithetic and arrivals is not None:
+        raise ValueError('Antithetic runs need arrivals from a BunchedExpSampler, not from data')
+    seedSeq = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    seeds = seedSeq.spawn(n)
+    args = (repeat(simClasses), repeat(nrLanes), repeat(T), repeat(alpha), repeat(mu), repeat(arrivals), seeds,
+            repeat(crn), repeat(antithetic))
+    if maxWorkers == 1:
+        results = list(map(runPair, *args))
+    else:
+        maxWorkers = maxWorkers or os.cpu_count()
+        chunksize = max(1, n // (4 * maxWorkers))
+        with ProcessPoolExecutor(max_workers=maxWorkers) as pool:
+            results = list(pool.map(runPair, *args, chunksize=chunksize))
+    meanW = np.stack([r[0] for r in results], axis=-1)
+    meanQL = np.stack([r[1] for r in results], axis=-1)
+    return meanW, meanQL
+
+
+def pairedDifferenceCI(samples, level=0.95):
+    """Confidence interval (mean, half-width) per lane of the difference class 0 minus
+    class 1, from the paired replications returned by comparePolicies"""
+    return [confidenceInterval(samples[0][lane] - samples[1][lane], level) for lane in range(samples.shape[1])]
+
+
+if __name__ == '__main__':
+    # alpha and mu were determined before, using the estimateParameters() function
+    alpha0, alpha1, mu0, mu1 = 0.5995995995995996, 0.5725725725725725, 0.21564291046984274, 0.3102950696782692
+
+    # FCFS minus exhaustive, with independent streams, common random numbers and CRN with antithetic pairs
+    n = 100
+    for crn, antithetic in [(False, False), (True, False), (True, True)]:
+        meanW, meanQL = comparePolicies(2, 1000, n, [alpha0, alpha1], [mu0, mu1], seed=2023, crn=crn, antithetic=antithetic)
+        print(f'crn={crn}, antithetic={antithetic}:')
+        for lane, ((dW, hW), (dQL, hQL)) in enumerate(zip(pairedDifferenceCI(meanW), pairedDifferenceCI(meanQL))):
+            print(f'  lane {lane}: waiting time {dW:.3f} +- {hW:.3f}, queue length {dQL:.3f} +- {hQL:.3f}')
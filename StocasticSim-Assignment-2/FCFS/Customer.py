@@ -1,5 +1,7 @@
 class Customer :
 
+    __slots__ = ('arrivalTime', 'lane')
+
     def __init__(self, arr, lane):
         self.arrivalTime = arr
         self.lane = lane
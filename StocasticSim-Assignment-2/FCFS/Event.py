@@ -2,6 +2,9 @@ class Event:
 
     ARRIVAL = 0
     DEPARTURE = 1
+    TRANSFER = 2    # arrival of a car from an upstream intersection, in a Network
+
+    __slots__ = ('type', 'time', 'customer', 'lane')
     
     def __init__(self, typ, time, lane, cust = None):  # type is a reserved word
         self.type = typ
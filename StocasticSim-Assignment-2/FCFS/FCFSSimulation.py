@@ -1,134 +1,219 @@
-from collections import deque
-from Customer import Customer
-from Event import Event
-from FES import FES
+from IntersectionSimulation import IntersectionSimulation
+from Policies import FCFSPolicy
 from SimResults import SimResults
-from BunchedExponential import BunchedExp
-import pandas as pd
-
-class FCFSSimulation :
-    
-    B = 1
-    S = 2.4
-
-    def __init__(self, arrDist, nrLanes, data: bool, alpha = None, mu = None): # arrDist should be a list of distributions for the various lanes / or a list of arrival times
-        self.arrDist = arrDist
-        self.nrLanes = nrLanes
-        self.data = data
-        self.alpha = alpha
-        self.mu = mu
-        
-    def simulate(self, T):
-        fes = FES()                                     # future event set
-        res = SimResults(self.nrLanes)                  # simulation results for lane 0
-        queue = [deque() for _ in range(self.nrLanes)]  # the queue for lane 0
-        t = 0                                           # current time
-        lastDepTime = 0                                   # last departure time
-        lastDepLane = 'not assigned'                      # last lane we departed from
-        if self.data: # first customers, for each lane.  We check whether we use data or distributions
-            c = [Customer(self.arrDist[lane].pop(0), lane) for lane in range(self.nrLanes)] #data contains arrival times
-        else:
-            c = [Customer(t + self.arrDist[lane](self.alpha[lane], self.mu[lane]), lane) for lane in range(self.nrLanes)]  # arrDist contains interarrival times 
-        firstEvents = [Event(Event.ARRIVAL, c[lane].arrivalTime, lane, c[lane]) for lane in range(self.nrLanes)]  #add arrival event for each lane
-        for lane in range(self.nrLanes):
-            fes.add(firstEvents[lane])                 # schedule first arrival event for all lanes
-        while t < T :                           # main loop
-            e = fes.next()                      # jump to next event
-            t = e.time                          # update the time
-            c1 = e.customer                 # customer associated with this event
-            lane = e.lane                   # lane associated with this event
-            res.registerQueueLength(t, len(queue[lane]), lane)  # register queue length
-            if e.type == Event.ARRIVAL :    # handle an arrival event
-                queue[lane].append(c1)            # add customer to the (correct lane) queue
-                if sum([len(queue[lane]) for lane in range(self.nrLanes)]) <= 1 : #there was a free server
-                    res.registerWaitingTime(t - c1.arrivalTime, lane)
-                    if c1.lane != lastDepLane and lastDepLane != 'not assigned':
-                        dep = Event(Event.DEPARTURE, max(t + FCFSSimulation.B, lastDepTime + FCFSSimulation.S) , c1.lane, c1)  
-                        lastDepTime = max(t + FCFSSimulation.B, lastDepTime + FCFSSimulation.S) 
-                    else:
-                        dep = Event(Event.DEPARTURE, t + FCFSSimulation.B , c1.lane, c1)
-                        lastDepTime = t + FCFSSimulation.B
-                    lastDepLane = lane
-                    fes.add(dep)            # schedule his departure
-                if self.data:
-                    c2 = Customer(self.arrDist[lane].pop(0), lane)
+import numpy as np
+from BunchedExponential import BunchedExpSampler
+from Replications import runReplications
+from TraceReplay import TraceReplay
+from ArrivalData import loadArrivals
+from OutputAnalysis import confidenceInterval
+
+class FCFSSimulation(IntersectionSimulation) :
+
+    def __init__(self, arrDist, nrLanes, data: bool, alpha = None, mu = None, trace = None): # arrDist should be a list of distributions for the various lanes / or a list of arrival times
+        IntersectionSimulation.__init__(self, arrDist, nrLanes, data, alpha, mu, FCFSPolicy(), trace)
+
+    def simulate_fast(self, T, res = None):
+        """Same model and same SimResults as simulate, but without events.
+
+        With deterministic service B and switch-over S the departure time of a
+        customer only depends on the previous departure, the previous lane and
+        its own arrival time. So we generate all arrivals per lane up front,
+        merge them in order of arrival and compute all waiting and departure
+        times in a single pass. Like simulate, the statistics include every
+        event up to and including the first event at or after T. As in simulate,
+        the results are collected in res or in a new SimResults."""
+        B, S = self.B, self.S
+        self.restartArrivals()
+        arrivals = [self.arrivalTimes(lane, T) for lane in range(self.nrLanes)]
+        arr = np.concatenate(arrivals)
+        lanes = np.concatenate([np.full(len(arrivals[lane]), lane) for lane in range(self.nrLanes)])
+        order = np.argsort(arr, kind='stable')  # merge the lanes, ties are broken by lane number
+        arr, lanes = arr[order], lanes[order]
+
+        # the recursion; python floats, so that every number is computed exactly as in simulate
+        n = len(arr)
+        start, dep, wait = [0.0] * n, [0.0] * n, [0.0] * n
+        lastDepTime = 0
+        lastDepLane = -1                        # no departures yet
+        for i, (a, lane) in enumerate(zip(arr.tolist(), lanes.tolist())):
+            if a >= lastDepTime or lastDepLane == -1:   # the server is free when the customer arrives
+                start[i] = a
+                if lane != lastDepLane and lastDepLane != -1:
+                    lastDepTime = max(a + B, lastDepTime + S)
                 else:
-                    c2 = Customer(t + self.arrDist[lane](self.alpha[lane], self.mu[lane]), lane) # create next arrival
-                arr = Event(Event.ARRIVAL, c2.arrivalTime, c2.lane,  c2)
-                fes.add(arr)   # schedule the next arrival
-            elif e.type == Event.DEPARTURE : # handle a departure event
-                queue[lane].remove(c1) # remove the customer 
-                if sum([len(queue[lane]) for lane in range(self.nrLanes)]) >= 1 : # someone was waiting (if any queue length is greater or equal to 1) # switch of lanes directly implies + S
-                    customers = [queue[lane][0] if len(queue[lane])>0 else None for lane in range(self.nrLanes)]
-                    c2 = min([cust for cust in customers if cust is not None]) # longest waiting customer #some queues may be empty                    
-                    res.registerWaitingTime(t - c2.arrivalTime, c2.lane) 
-                    if c2.lane != lastDepLane and lastDepLane != 'not assigned': #depending on wheter or not we switched lanes we add the departure event.
-                        dep = Event(Event.DEPARTURE, t + FCFSSimulation.S, c2.lane, c2)
-                        lastDepTime = t + FCFSSimulation.S
-                    else:
-                        dep = Event(Event.DEPARTURE, t + FCFSSimulation.B, c2.lane, c2)
-                        lastDepTime = t + FCFSSimulation.B
-                    lastDepLane = c2.lane  
-                    fes.add(dep)  # schedule this departure
+                    lastDepTime = a + B
+            else:                                       # served right after the previous departure
+                start[i] = lastDepTime
+                wait[i] = lastDepTime - a
+                lastDepTime = lastDepTime + (S if lane != lastDepLane else B)
+            dep[i] = lastDepTime
+            lastDepLane = lane
+        start, dep, wait = np.array(start), np.array(dep), np.array(wait)
+
+        # simulate stops after the first event at or after T
+        later = np.concatenate((arr[arr >= T], dep[dep >= T]))
+        tEnd = later.min() if len(later) > 0 else np.inf
+
+        if res is None:
+            res = SimResults(self.nrLanes)
+        for lane in range(self.nrLanes):
+            inLane = lanes == lane
+            res.registerWaitingTimes(wait[inLane & (start <= tEnd)], lane)
+            laneArr = arr[inLane & (arr <= tEnd)]
+            laneDep = dep[inLane & (dep <= tEnd)]
+            times = np.concatenate((laneArr, laneDep))
+            steps = np.concatenate((np.ones(len(laneArr), dtype=int), -np.ones(len(laneDep), dtype=int)))
+            order = np.argsort(times, kind='stable')
+            qls = np.cumsum(steps[order]) - steps[order]    # queue length just before each event
+            res.registerQueueLengths(times[order], qls, lane)
+        if self.trace is not None:
+            left = dep <= tEnd              # the cars depart in order of arrival
+            self.trace.recordMany(lanes[left], arr[left], dep[left] - B)
         return res
 
-
-#with distributions
-print('with distribution')
-alpha0, alpha1, mu0, mu1 = 0.5995995995995996, 0.5725725725725725, 0.21564291046984274, 0.3102950696782692
-
-
-arrDist = [BunchedExp, BunchedExp] # interarrival time distr. for each lane
-sim = FCFSSimulation(arrDist, 2, False, [alpha0, alpha1], [mu0, mu1]) # the simulation model
-res = sim.simulate(1000000)  # perform simulation 
-print(res)  # print the results
-
-res.histQueueLength(8000)  # plot of the queue length
-res.histWaitingTimes()  # histogram of waiting times
-
-# with data
-print('with data')
-df = pd.read_excel(r'C:\Users\20203453\Documents\GitHub\StocasticSim-Assignment-2\arrivals5.xlsx', header = None)
-
-df.columns = [0,1]
-lane0 = df[0].tolist()
-lane1 = df[1].tolist()
-
-arrDist = [lane0, lane1]
-
-sim = FCFSSimulation(arrDist, 2, True) # the simulation model
-
-# confidence intervals for the mean waiting times of the lanes
-
-# number of simulation runs
-n=6000
-
-sample_means_1 = []
-sample_means_2 = []
-
-for a in range(n):
-    res = sim.simulate(10000)  # perform simulation 
-    single_sample_mean_1 = res.getMeanWaitingTime(0)
-    single_sample_mean_2 = res.getMeanWaitingTime(1)
-    sample_means_1.append(single_sample_mean_1)
-    sample_means_2.append(single_sample_mean_2)
-
-# lane1
-mean_mean_waiting_time1 = np.mean(sample_means_1)
-lower1 = np.percentile(sample_means_1,2.5)
-upper1 = np.percentile(sample_means_1,97.5)
-
-# lane2
-mean_mean_waiting_time2 = np.mean(sample_means_2)
-lower2 = np.percentile(sample_means_2,2.5)
-upper2 = np.percentile(sample_means_2,97.5)
-
-print(f"lane 1 {lower1}-{mean_mean_waiting_time1}-{upper1}")
-print(f"lane 2 {lower2}-{mean_mean_waiting_time2}-{upper2}")
-
-
-print(res)  # print the results
-
-res.histQueueLength(150)  # plot of the queue length
-res.histWaitingTimes()  # histogram of waiting times
-
+    def simulate_batch(self, T, R, seed=None, batchSize=200):
+        """Perform R independent replications of simulate_fast at once, as array computations.
+
+        The replications are held as (R, N) arrays (N is the largest number of
+        arrivals in a replication, shorter ones are padded with inf) and the
+        recursion of simulate_fast is stepped for all replications together.
+        T is the horizon, or an array with a horizon per replication; events
+        after the cut-off of a replication are masked out. Replication r draws
+        its arrivals with a BunchedExpSampler seeded with the r-th stream of
+        SeedSequence(seed).spawn(R), just like runReplications. With data every
+        replication replays the data, or draws a bootstrap resample of it with that
+        stream if the data is a TraceReplay with bootstrap=True. To bound the memory, batchSize
+        replications are computed at a time.
+
+        Returns (meanW, meanQL): arrays of shape (nrLanes, R) with the mean
+        waiting time and the mean queue length of every lane and replication."""
+        T = np.broadcast_to(np.asarray(T, dtype=float), (R,))
+        seeds = np.random.SeedSequence(seed).spawn(R)
+        meanW = np.zeros((self.nrLanes, R))
+        meanQL = np.zeros((self.nrLanes, R))
+        for first in range(0, R, batchSize):
+            reps = range(first, min(first + batchSize, R))
+            arrivals = []                       # arrivals[r][lane]
+            for r in reps:
+                if self.data:
+                    source = self.arrDist
+                    source.restart(seeds[r])    # TraceReplay: the data, or a bootstrap resample seeded for this replication
+                else:
+                    source = BunchedExpSampler(self.alpha, self.mu, self.B, seed=seeds[r])
+                arrivals.append([source.arrivalsUntil(lane, T[r]) for lane in range(self.nrLanes)])
+            meanW[:, reps], meanQL[:, reps] = self.batchStatistics(arrivals, T[reps])
+        return meanW, meanQL
+
+    def batchStatistics(self, arrivals, T):
+        """Mean waiting times and queue lengths (shape (nrLanes, R)) for arrivals[r][lane] of R replications"""
+        B, S = self.B, self.S
+        R = len(arrivals)
+        sizes = [[len(arrivals[r][lane]) for r in range(R)] for lane in range(self.nrLanes)]
+        arr = np.full((R, sum(max(n) for n in sizes)), np.inf)  # every lane gets its own block of columns
+        lanes = np.zeros(arr.shape, dtype=int)
+        col = 0
+        for lane in range(self.nrLanes):
+            for r in range(R):
+                arr[r, col:col + sizes[lane][r]] = arrivals[r][lane]
+            lanes[:, col:col + max(sizes[lane])] = lane
+            col += max(sizes[lane])
+        order = np.argsort(arr, axis=1, kind='stable')  # merge the lanes of every replication
+        arr = np.take_along_axis(arr, order, axis=1)
+        lanes = np.take_along_axis(lanes, order, axis=1)
+
+        # the recursion of simulate_fast, one step for all replications at the same time
+        # (on the transposed arrays, so that every step reads and writes contiguous rows)
+        arrT, lanesT = np.ascontiguousarray(arr.T), np.ascontiguousarray(lanes.T)
+        start, dep, wait = np.zeros(arrT.shape), np.zeros(arrT.shape), np.zeros(arrT.shape)
+        lastDepTime = np.zeros(R)
+        lastDepLane = np.full(R, -1)
+        with np.errstate(invalid='ignore'):     # inf - inf in the padding, which is masked out anyway
+            for i in range(len(arrT)):
+                a, lane = arrT[i], lanesT[i]
+                free = (a >= lastDepTime) | (lastDepLane == -1)
+                switch = lane != lastDepLane
+                depFree = np.where(switch & (lastDepLane != -1), np.maximum(a + B, lastDepTime + S), a + B)
+                depQueued = lastDepTime + np.where(switch, S, B)
+                start[i] = np.where(free, a, lastDepTime)
+                wait[i] = np.where(free, 0.0, lastDepTime - a)
+                lastDepTime = np.where(free, depFree, depQueued)
+                dep[i] = lastDepTime
+                lastDepLane = lane
+        start, dep, wait = start.T, dep.T, wait.T
+
+        # every replication stops after its first event at or after T
+        later = np.minimum(np.where(arr >= T[:, None], arr, np.inf).min(axis=1), np.where(dep >= T[:, None], dep, np.inf).min(axis=1))
+        tEnd = later[:, None]
+
+        meanW = np.zeros((self.nrLanes, R))
+        meanQL = np.zeros((self.nrLanes, R))
+        for lane in range(self.nrLanes):
+            inLane = (lanes == lane) & np.isfinite(arr)
+            served = inLane & (start <= tEnd)
+            meanW[lane] = np.where(served, wait, 0.0).sum(axis=1) / served.sum(axis=1)
+            # queue length: +1 at every arrival and -1 at every departure of the lane before the cut-off
+            steps = np.concatenate((np.where(inLane & (arr <= tEnd), 1, 0), np.where(inLane & (dep <= tEnd), -1, 0)), axis=1)
+            times = np.concatenate((arr, dep), axis=1)
+            times = np.where(steps != 0, times, np.inf)
+            order = np.argsort(times, axis=1, kind='stable')
+            times = np.take_along_axis(times, order, axis=1)
+            steps = np.take_along_axis(steps, order, axis=1)
+            qls = np.cumsum(steps, axis=1) - steps  # queue length just before each event
+            valid = steps != 0
+            lastTime = np.where(valid, times, 0.0).max(axis=1)
+            dt = np.diff(np.where(valid, times, lastTime[:, None]), axis=1, prepend=0.0)
+            meanQL[lane] = (qls * dt).sum(axis=1) / lastTime
+        return meanW, meanQL
+
+
+if __name__ == '__main__':
+    #with distributions
+    print('with distribution')
+    alpha0, alpha1, mu0, mu1 = 0.5995995995995996, 0.5725725725725725, 0.21564291046984274, 0.3102950696782692
+
+
+    arrDist = BunchedExpSampler(seed=2023) # interarrival time distr. for each lane, seeded so the run can be reproduced
+    sim = FCFSSimulation(arrDist, 2, False, [alpha0, alpha1], [mu0, mu1]) # the simulation model
+    res = sim.simulate_fast(1000000)  # perform simulation, without events since that is much faster for FCFS
+    print(res)  # print the results
+
+    res.histQueueLength(8000)  # plot of the queue length
+    res.histWaitingTimes()  # histogram of waiting times
+
+    # with data
+    print('with data')
+    arrDist = loadArrivals()  # arrival times of both lanes in arrivals5.xlsx, cached as .npy files after the first run
+    # the data covers less than the horizon of 10000, so every run gets a bootstrap resample of it
+    bootstrap = TraceReplay(arrDist, bootstrap=True)
+
+    # confidence intervals for the mean waiting times of the lanes
+
+    # number of simulation runs
+    n=6000
+
+    # the runs are divided over all cores, every run gets its own resample of the data
+    meanW, meanQL = runReplications(FCFSSimulation, 2, 10000, n, arrivals=bootstrap, seed=2023)
+    sample_means_1 = meanW[0]
+    sample_means_2 = meanW[1]
+
+    # lane1
+    mean_mean_waiting_time1, half_width1 = confidenceInterval(sample_means_1)  # 95% t confidence interval
+    lower1 = mean_mean_waiting_time1 - half_width1
+    upper1 = mean_mean_waiting_time1 + half_width1
+
+    # lane2
+    mean_mean_waiting_time2, half_width2 = confidenceInterval(sample_means_2)  # 95% t confidence interval
+    lower2 = mean_mean_waiting_time2 - half_width2
+    upper2 = mean_mean_waiting_time2 + half_width2
+
+    print(f"lane 1 {lower1}-{mean_mean_waiting_time1}-{upper1}")
+    print(f"lane 2 {lower2}-{mean_mean_waiting_time2}-{upper2}")
+
+    sim = FCFSSimulation(arrDist, 2, True) # the simulation model, replaying the data itself
+    res = sim.simulate(2000)  # perform one more simulation within the data, to show its results
+
+    print(res)  # print the results
+
+    res.histQueueLength(150)  # plot of the queue length
+    res.histWaitingTimes()  # histogram of waiting times
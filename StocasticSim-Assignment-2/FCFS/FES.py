@@ -25,4 +25,69 @@ class FES :
         return s
 
 
+class CompactFES :
+    """Future event set that stores every event as a flat (time, seq, type, lane, index) tuple.
+    Ties in time are broken by seq, the order in which the events were added, so the
+    tuples are compared by python in C and no Event objects are needed. index is the
+    number of the customer within its lane."""
 
+    def __init__(self):
+        self.events = []
+        self.seq = 0
+
+    def add(self, time, typ, lane, index):
+        heapq.heappush(self.events, (time, self.seq, typ, lane, index))
+        self.seq += 1
+
+    def next(self):
+        return heapq.heappop(self.events)
+
+    def isEmpty(self):
+        return len(self.events) == 0
+
+    def __len__(self):
+        return len(self.events)
+
+    def __str__(self):
+        s = ('Arrival', 'Departure')
+        return ''.join(f'{s[typ]} of customer {index} of lane {lane} at t = {time}\n' for time, _, typ, lane, index in sorted(self.events))
+
+
+class NetworkFES :
+    """Future event set shared by all intersections of a Network. Events are flat
+    (time, seq, node, type, lane, index) tuples, as in CompactFES but tagged with
+    the number of the intersection."""
+
+    def __init__(self):
+        self.events = []
+        self.seq = 0
+
+    def add(self, time, node, typ, lane, index):
+        heapq.heappush(self.events, (time, self.seq, node, typ, lane, index))
+        self.seq += 1
+
+    def next(self):
+        return heapq.heappop(self.events)
+
+    def isEmpty(self):
+        return len(self.events) == 0
+
+    def __len__(self):
+        return len(self.events)
+
+
+class NodeFES :
+    """The view of one intersection on a NetworkFES: add has the signature of CompactFES.add,
+    so an IntersectionSimulation schedules its events in the shared set without changes."""
+
+    __slots__ = ('fes', 'node')
+
+    def __init__(self, fes, node):
+        self.fes = fes
+        self.node = node
+
+    def add(self, time, typ, lane, index):
+        self.fes.add(time, self.node, typ, lane, index)
+
+    def __len__(self):
+        return len(self.fes)
@@ -0,0 +1,39 @@
+import time
+
+import numpy as np
+
+from Event import Event
+from FES import FES, CompactFES
+
+
+def benchmarkFES(nrEvents=200000, queueSize=100, seed=1):
+    """Events per second (one add plus one next) of FES with Event objects and of CompactFES.
+    The FES is kept at queueSize events, like during a simulation; it gets the same event times for both."""
+    times = np.random.default_rng(seed).exponential(1.0, nrEvents + queueSize).tolist()
+    result = {}
+
+    fes = FES()
+    start = time.perf_counter()
+    for i in range(queueSize):
+        fes.add(Event(Event.ARRIVAL, times[i], i % 2))
+    for i in range(queueSize, nrEvents + queueSize):
+        e = fes.next()
+        fes.add(Event(Event.DEPARTURE, e.time + times[i], e.lane))
+    result['FES'] = nrEvents / (time.perf_counter() - start)
+
+    fes = CompactFES()
+    start = time.perf_counter()
+    for i in range(queueSize):
+        fes.add(times[i], Event.ARRIVAL, i % 2, i)
+    for i in range(queueSize, nrEvents + queueSize):
+        t, _, typ, lane, index = fes.next()
+        fes.add(t + times[i], Event.DEPARTURE, lane, index)
+    result['CompactFES'] = nrEvents / (time.perf_counter() - start)
+    return result
+
+
+if __name__ == '__main__':
+    for queueSize in [4, 100, 10000]:
+        result = benchmarkFES(queueSize=queueSize)
+        print(f"FES size {queueSize}: " + ', '.join(f'{name} {rate:,.0f} events/sec' for name, rate in result.items())
+              + f" (speed-up {result['CompactFES'] / result['FES']:.1f}x)")
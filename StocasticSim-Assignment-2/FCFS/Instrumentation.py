@@ -0,0 +1,157 @@
+import cProfile
+import io
+import pstats
+import time
+import tracemalloc
+
+from Event import Event
+
+
+class TimedResults:
+    """Wraps a SimResults and measures the time spent in its register methods"""
+
+    def __init__(self, res, monitor):
+        self.res = res
+        self.monitor = monitor
+
+    def registerQueueLength(self, time_, ql, lane):
+        start = time.perf_counter()
+        self.res.registerQueueLength(time_, ql, lane)
+        self.monitor.handlerTime['registerQueueLength'] += time.perf_counter() - start
+
+    def registerWaitingTime(self, w, lane):
+        start = time.perf_counter()
+        self.res.registerWaitingTime(w, lane)
+        self.monitor.handlerTime['registerWaitingTime'] += time.perf_counter() - start
+
+    def __getattr__(self, name):
+        return getattr(self.res, name)
+
+
+class Monitor:
+    """Instrumentation of one run of IntersectionSimulation.simulate, pass it as
+    simulate(T, monitor=Monitor()). It counts the events per type, keeps the peak
+    size of the future event set and of the queue of every lane, and measures
+    the wall time of the arrival and departure handlers and of the SimResults
+    register methods (the handler times include the register calls they make).
+    Every `every` events progress(monitor, sim) is called, if given.
+
+    The instrumented run uses its own event loop, so simulate without a monitor
+    is not slowed down at all; the results of the run are the same."""
+
+    def __init__(self, progress=None, every=100000):
+        self.progress = progress
+        self.every = every
+        self.events = {Event.ARRIVAL: 0, Event.DEPARTURE: 0}
+        self.peakFES = 0
+        self.peakQueue = []
+        self.handlerTime = {'arrival': 0.0, 'departure': 0.0, 'registerQueueLength': 0.0, 'registerWaitingTime': 0.0}
+        self.wallTime = 0.0
+        self.T = None
+        self.t = 0
+
+    def nrEvents(self):
+        return sum(self.events.values())
+
+    def eventsPerSecond(self):
+        return self.nrEvents() / self.wallTime if self.wallTime > 0 else 0.0
+
+    def run(self, sim, T):
+        """The main loop of simulate, with measurements; sim has been set up by simulate"""
+        self.T = T
+        self.peakQueue = [0] * sim.nrLanes
+        res = sim.res
+        sim.res = TimedResults(res, self)
+        fes, events, handlerTime, peakQueue = sim.fes, self.events, self.handlerTime, self.peakQueue
+        clock = time.perf_counter
+        wallStart = clock()
+        while sim.t < T:
+            self.peakFES = max(self.peakFES, len(fes))
+            sim.t, _, typ, lane, index = fes.next()
+            ql = len(sim.queue[lane]) - sim.head[lane]
+            peakQueue[lane] = max(peakQueue[lane], ql)
+            sim.res.registerQueueLength(sim.t, ql, lane)
+            start = clock()
+            if typ == Event.ARRIVAL:
+                sim.handleArrival(lane, index)
+                handlerTime['arrival'] += clock() - start
+            else:
+                sim.handleDeparture(lane, index)
+                handlerTime['departure'] += clock() - start
+            events[typ] += 1
+            if self.progress is not None and (events[Event.ARRIVAL] + events[Event.DEPARTURE]) % self.every == 0:
+                self.t = sim.t
+                self.wallTime = clock() - wallStart
+                self.progress(self, sim)
+        self.t = sim.t
+        self.wallTime = clock() - wallStart
+        sim.res = res
+        return res
+
+    def report(self):
+        lines = [f'{self.nrEvents():,} events ({self.events[Event.ARRIVAL]:,} arrivals, '
+                 f'{self.events[Event.DEPARTURE]:,} departures) in {self.wallTime:.3f} s, '
+                 f'{self.eventsPerSecond():,.0f} events/sec',
+                 f'peak FES size {self.peakFES}, peak queue length per lane {self.peakQueue}']
+        for name, seconds in self.handlerTime.items():
+            share = 100 * seconds / self.wallTime if self.wallTime > 0 else 0
+            lines.append(f'{name:>20}: {seconds:.3f} s ({share:.1f}%)')
+        return '\n'.join(lines)
+
+    def __str__(self):
+        return self.report()
+
+
+def printProgress(monitor, sim):
+    """A progress callback for Monitor that prints how far the run is"""
+    print(f't = {monitor.t:.0f} of {monitor.T} ({100 * monitor.t / monitor.T:.1f}%), '
+          f'{monitor.nrEvents():,} events, {monitor.eventsPerSecond():,.0f} events/sec')
+
+
+def profileRun(function, *args, path=None, memory=False, sortBy='cumulative', top=25, **kwargs):
+    """Call function(*args, **kwargs) under cProfile, and with memory=True also under
+    tracemalloc. Returns (result, report): the report lists the top functions by sortBy
+    and, with memory, the peak traced memory and the lines that allocated the most.
+    With path the report is written to that file; a path ending in .prof gets the raw
+    profile instead, for pstats or snakeviz."""
+    if memory:
+        tracemalloc.start()
+    profile = cProfile.Profile()
+    try:
+        result = profile.runcall(function, *args, **kwargs)
+        if memory:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+    finally:
+        if memory:
+            tracemalloc.stop()
+    out = io.StringIO()
+    pstats.Stats(profile, stream=out).sort_stats(sortBy).print_stats(top)
+    report = out.getvalue()
+    if memory:
+        report += f'peak traced memory {peak / 2**20:.1f} MiB, top allocations:\n'
+        report += '\n'.join(str(stat) for stat in snapshot.statistics('lineno')[:top]) + '\n'
+    if path is not None:
+        if path.endswith('.prof'):
+            profile.dump_stats(path)
+        else:
+            with open(path, 'w') as f:
+                f.write(report)
+    return result, report
+
+
+if __name__ == '__main__':
+    from BunchedExponential import BunchedExpSampler
+    from FCFSSimulation import FCFSSimulation
+
+    # alpha and mu were determined before, using the estimateParameters() function
+    alpha0, alpha1, mu0, mu1 = 0.5995995995995996, 0.5725725725725725, 0.21564291046984274, 0.3102950696782692
+
+    monitor = Monitor(progress=printProgress, every=200000)
+    sim = FCFSSimulation(BunchedExpSampler(seed=2023), 2, False, [alpha0, alpha1], [mu0, mu1])
+    sim.simulate(100000, monitor=monitor)
+    print(monitor)
+
+    sim = FCFSSimulation(BunchedExpSampler(seed=2023), 2, False, [alpha0, alpha1], [mu0, mu1])
+    _, report = profileRun(sim.simulate, 100000, memory=True, top=15)
+    print(report)
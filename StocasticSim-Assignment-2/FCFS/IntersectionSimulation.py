@@ -0,0 +1,247 @@
+import asyncio
+import os
+import pickle
+
+from Event import Event
+from FES import CompactFES
+from SimResults import SimResults
+from Streaming import Departure, WindowCollector
+import numpy as np
+from Policies import FCFSPolicy
+from TraceReplay import TraceReplay
+
+
+class IntersectionSimulation:
+    """One intersection: a single server fed by nrLanes lanes, with a deterministic
+    service time B for cars from the same lane and a switch-over time S when the
+    server changes lanes. The order in which the lanes are served is decided by the
+    policy (FCFSPolicy, ExhaustivePolicy, GatedPolicy, KLimitedPolicy, FixedCyclePolicy)."""
+
+    B = 1
+    S = 2.4
+    NO_LANE = -1    # lastDepLane before the first car is served
+
+    def __init__(self, arrDist, nrLanes, data: bool, alpha = None, mu = None, policy = None, trace = None): # arrDist should be a list of distributions for the various lanes / or a list of arrival times
+        if data and not hasattr(arrDist, 'nextArrival'):
+            arrDist = TraceReplay(arrDist)                  # replays the arrival times, without changing the lists
+        self.arrDist = arrDist
+        self.nrLanes = nrLanes
+        self.data = data
+        self.alpha = alpha
+        self.mu = mu
+        self.policy = policy if policy is not None else FCFSPolicy()
+        self.trace = trace                                  # TraceSink for the lane, arrival and service time of every car, or None
+        if hasattr(arrDist, 'setParameters') and alpha is not None:
+            arrDist.setParameters(alpha, mu, self.B)  # a BunchedExpSampler draws for all lanes, with the parameters of this simulation
+
+    def nextArrival(self, lane, t):
+        """Arrival time of the next customer of a lane, t is the arrival time of the previous one"""
+        if hasattr(self.arrDist, 'nextArrival'):
+            return self.arrDist.nextArrival(lane, t)                        # one source for all lanes, e.g. BunchedExpSampler or TraceReplay
+        return t + self.arrDist[lane](self.alpha[lane], self.mu[lane])      # arrDist contains interarrival times
+
+    def arrivalTimes(self, lane, T):
+        """All arrival times of a lane up to and including the first one at or after T, as an array.
+        The arrivals are taken from the data/distributions in the same way as nextArrival does."""
+        if hasattr(self.arrDist, 'arrivalsUntil'):
+            return self.arrDist.arrivalsUntil(lane, T)
+        times = []
+        t = 0
+        while t < T:
+            t = self.nextArrival(lane, t)
+            times.append(t)
+        return np.array(times, dtype=float)
+
+    def restartArrivals(self):
+        """Called at the start of every run: a TraceReplay starts again from the start of the
+        data (or a new bootstrap resample); a sampler just continues with its random streams."""
+        if hasattr(self.arrDist, 'restart'):
+            self.arrDist.restart()
+
+    def queueLength(self, lane):
+        """Number of cars of a lane in the system, including the one in service"""
+        return len(self.queue[lane]) - self.head[lane]
+
+    def headArrival(self, lane):
+        """Arrival time of the first car in the queue of a lane"""
+        return self.queue[lane][self.head[lane]]
+
+    def registerDeparture(self, t, lane, arrival, serviceStart):
+        """Called at every departure. The service time that is traced is the time the car
+        reaches the intersection, i.e. its departure time minus B."""
+        if self.trace is not None:
+            self.trace.record(lane, arrival, t - self.B)
+        if self.stream is not None:
+            self.stream.append(Departure(lane, arrival, serviceStart, serviceStart - arrival, t))
+
+    def start(self, res = None, fes = None):
+        """Empty intersection at t = 0, without any events yet. Events are added to fes,
+        by default a new CompactFES; a Network passes a view on its shared event set."""
+        self.fes = fes if fes is not None else CompactFES()  # future event set
+        self.res = res if res is not None else SimResults(self.nrLanes)  # simulation results for all lanes
+        # the customers of every lane are stored as arrays: arrival times and service start times,
+        # the cars that are still in the system start at position head[lane]
+        self.queue = [[] for _ in range(self.nrLanes)]      # arrival times of the cars of every lane
+        self.serviceStart = [[] for _ in range(self.nrLanes)]  # service start times, for the cars that got served
+        self.head = [0] * self.nrLanes                      # position of the first car in the queue of every lane
+        self.base = [0] * self.nrLanes                      # number of the customer at position 0 of every lane
+        self.nrQueued = 0                                   # number of cars in all queues together
+        self.nonEmpty = 0                                   # bitset, bit lane is set if the lane has cars
+        self.t = 0                                          # current time
+        self.lastDepTime = 0                                # last departure time
+        self.lastDepLane = IntersectionSimulation.NO_LANE   # last lane we departed from
+        self.stream = None                                  # departures that iter_simulate has not yielded yet
+        self.policy.reset(self)
+        self.restartArrivals()
+
+    def simulate(self, T, res = None, monitor = None, checkpoint = None, every = None, interval = None):
+        """Simulate until the first event at or after T. The results are collected in res
+        (for example a StreamingSimResults), by default in a new SimResults. With an
+        Instrumentation.Monitor the run is measured, see Monitor. For checkpoint, every
+        and interval see resume."""
+        self.start(res)
+        for lane in range(self.nrLanes):                    # schedule the first arrival for all lanes
+            self.fes.add(self.nextArrival(lane, self.t), Event.ARRIVAL, lane, 0)
+        return self.resume(T, monitor, checkpoint, every, interval)
+
+    def resume(self, T, monitor = None, checkpoint = None, every = None, interval = None):
+        """Continue the run until the first event at or after T, so after simulate(T1),
+        resume(T2) gives exactly the same results as simulate(T2).
+
+        With checkpoint (a file name) the whole simulation (state of the run, results,
+        random streams, policy) is stored in that file every `every` events and/or every
+        `interval` units of simulated time, and at the end. After an interruption
+        loadCheckpoint(checkpoint).resume(T) continues the run as if it was never stopped."""
+        if monitor is not None:
+            monitor.run(self, T)                            # the same loop, with counters and timers
+        if checkpoint is None:
+            fes, res = self.fes, self.res
+            while self.t < T :                              # main loop
+                self.t, _, typ, lane, index = fes.next()    # jump to next event
+                res.registerQueueLength(self.t, len(self.queue[lane]) - self.head[lane], lane)  # register queue length
+                if typ == Event.ARRIVAL :
+                    self.handleArrival(lane, index)
+                else :
+                    self.handleDeparture(lane, index)
+        else:
+            events = 0
+            nextSave = np.inf if interval is None else (self.t // interval + 1) * interval
+            while self.t < T:
+                self.step()
+                events += 1
+                if (every is not None and events % every == 0) or self.t >= nextSave:
+                    self.saveCheckpoint(checkpoint)
+                    if interval is not None:
+                        nextSave = (self.t // interval + 1) * interval
+            self.saveCheckpoint(checkpoint)
+        if self.trace is not None:
+            self.trace.flush()
+        return self.res
+
+    def iter_simulate(self, T, res = None, window = None):
+        """Generator version of simulate: yields a Streaming.Departure record for every car
+        as it leaves and, with window, a Streaming.Window record with the statistics of
+        every window of that length as soon as the window is over (and of the last, partial
+        window at the end). The run only advances when the next record is asked for, and
+        records that were yielded are not kept. The results are also collected in res, as
+        in simulate; the value the generator returns is res."""
+        self.start(res)
+        for lane in range(self.nrLanes):
+            self.fes.add(self.nextArrival(lane, self.t), Event.ARRIVAL, lane, 0)
+        self.stream = []
+        collector = WindowCollector(self.nrLanes, window) if window is not None else None
+        events = self.fes.events
+        while self.t < T:
+            if collector is not None:
+                t, _, _, lane, _ = events[0]                # the next event
+                while t >= collector.end:
+                    yield collector.close([self.queueLength(l) for l in range(self.nrLanes)])
+                collector.queueLength(lane, t, self.queueLength(lane))
+            self.step()
+            if self.stream:
+                for record in self.stream:
+                    if collector is not None:
+                        collector.departure(record)
+                    yield record
+                self.stream.clear()
+        if collector is not None:
+            yield collector.close([self.queueLength(l) for l in range(self.nrLanes)], self.t)
+        self.stream = None
+        if self.trace is not None:
+            self.trace.flush()
+        return self.res
+
+    async def aiter_simulate(self, T, res = None, window = None, batch = 1000):
+        """iter_simulate as an asynchronous iterator, for asyncio consumers: after every batch
+        records control goes back to the event loop, so other tasks keep running. The
+        results are in self.res afterwards."""
+        for i, record in enumerate(self.iter_simulate(T, res, window)):
+            yield record
+            if i % batch == batch - 1:
+                await asyncio.sleep(0)
+
+    def step(self):
+        """Handle the next event"""
+        self.t, _, typ, lane, index = self.fes.next()
+        self.res.registerQueueLength(self.t, len(self.queue[lane]) - self.head[lane], lane)
+        if typ == Event.ARRIVAL:
+            self.handleArrival(lane, index)
+        else:
+            self.handleDeparture(lane, index)
+
+    def saveCheckpoint(self, path):
+        """Store the whole simulation in a file with pickle; the file is replaced at once,
+        so an interruption while saving leaves the previous checkpoint"""
+        with open(path + '.tmp', 'wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + '.tmp', path)
+
+    @staticmethod
+    def loadCheckpoint(path):
+        """The simulation stored by saveCheckpoint, continue it with resume"""
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+    def handleArrival(self, lane, index):
+        self.addCar(lane)
+        self.fes.add(self.nextArrival(lane, self.t), Event.ARRIVAL, lane, index + 1)  # schedule the next arrival
+
+    def addCar(self, lane):
+        """A car joins the queue of a lane at the current time"""
+        self.queue[lane].append(self.t)                     # add customer to the (correct lane) queue
+        self.nrQueued += 1
+        self.nonEmpty |= 1 << lane
+        self.policy.arrival(self, lane)
+        if self.nrQueued == 1 :                             # there was a free server
+            self.startService()
+
+    def handleDeparture(self, lane, index):
+        pos = index - self.base[lane]                       # the departing customer is always first in its queue
+        self.registerDeparture(self.t, lane, self.queue[lane][pos], self.serviceStart[lane][pos])
+        self.head[lane] += 1
+        if self.head[lane] > 1000 and 2 * self.head[lane] > len(self.queue[lane]):
+            del self.queue[lane][:self.head[lane]]          # forget the customers that left, now and then
+            del self.serviceStart[lane][:self.head[lane]]
+            self.base[lane] += self.head[lane]
+            self.head[lane] = 0
+        self.nrQueued -= 1
+        if self.head[lane] == len(self.queue[lane]):
+            self.nonEmpty &= ~(1 << lane)
+        self.policy.departure(self, lane)
+        if self.nrQueued >= 1 :                             # someone was waiting
+            self.startService()
+
+    def startService(self):
+        """The server is free and there is a car waiting, let the policy pick the lane and schedule its departure"""
+        lane = self.policy.selectLane(self)
+        pos = self.head[lane]
+        start = self.policy.startTime(self, lane)
+        self.serviceStart[lane].append(start)
+        self.res.registerWaitingTime(start - self.queue[lane][pos], lane)
+        if lane != self.lastDepLane and self.lastDepLane != IntersectionSimulation.NO_LANE:
+            gap = self.S                                    # switch of lanes
+        else:
+            gap = self.B
+        self.lastDepTime = max(start + self.B, self.lastDepTime + gap)
+        self.lastDepLane = lane
+        self.fes.add(self.lastDepTime, Event.DEPARTURE, lane, self.base[lane] + pos)  # schedule this departure
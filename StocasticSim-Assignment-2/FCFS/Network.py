@@ -0,0 +1,159 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from BunchedExponential import BunchedExpSampler
+from Event import Event
+from FES import NetworkFES, NodeFES
+from IntersectionSimulation import IntersectionSimulation
+from Policies import FCFSPolicy
+from SimResults import SimResults, StreamingSimResults
+
+
+class Network:
+    """Intersections (IntersectionSimulation objects, with any policy) connected by links:
+    a car that leaves lane fromLane of intersection fromNode joins lane toLane of toNode
+    travelTime later. All intersections share one future event set, so a network of
+    hundreds of intersections is simulated in a single event loop.
+
+    Lanes without incoming links get their cars from the arrival source of their
+    intersection (arrDist, such as a BunchedExpSampler); the other lanes only get cars
+    from upstream. A car leaves the network when it departs from a lane without
+    outgoing links, or with the remaining fraction if the fractions of the links of a
+    lane add up to less than 1. Every intersection collects its own SimResults; the
+    delay of every car (time in the network minus the travel times of the links and
+    B per intersection) is collected per route, the sequence of intersections it passed."""
+
+    def __init__(self, nodes, seed=None):
+        self.nodes = list(nodes)
+        self.links = {}                     # (node, lane) -> list of (toNode, toLane, travelTime, fraction)
+        self.seed = seed
+
+    def connect(self, fromNode, fromLane, toNode, toLane, travelTime, fraction=1.0):
+        """Send a fraction of the cars that leave fromLane of fromNode to toLane of toNode"""
+        links = self.links.setdefault((fromNode, fromLane), [])
+        if sum(link[3] for link in links) + fraction > 1 + 1e-12:
+            raise ValueError(f'The fractions of the links of lane {fromLane} of intersection {fromNode} add up to more than 1')
+        links.append((toNode, toLane, travelTime, fraction))
+
+    def sourceLanes(self, node):
+        """The lanes of an intersection that get their cars from its arrival source"""
+        fed = {(toNode, toLane) for links in self.links.values() for toNode, toLane, _, _ in links}
+        return [lane for lane in range(self.nodes[node].nrLanes) if (node, lane) not in fed]
+
+    def route(self, node, lane):
+        """The link a car that leaves lane of node takes, or None if it leaves the network"""
+        links = self.links.get((node, lane))
+        if not links:
+            return None
+        if len(links) == 1 and links[0][3] == 1:
+            return links[0]
+        u = self.rng.random()
+        for link in links:
+            u -= link[3]
+            if u < 0:
+                return link
+        return None
+
+    def simulate(self, T, results=None):
+        """Simulate until the first event at or after T. The results of intersection i are
+        collected in results[i], by default in a new SimResults; the route delays in
+        self.routeResults, a dict from route (a tuple of intersections) to a
+        StreamingSimResults with a single lane. Returns the list of results."""
+        self.fes = NetworkFES()
+        self.rng = np.random.default_rng(self.seed)     # the routing, the same for every run with the same seed
+        results = results if results is not None else [SimResults(sim.nrLanes) for sim in self.nodes]
+        self.routeResults = {}
+        self.routeFreeTime = {}
+        # the cars in the queues: cars[node][lane] maps the number of a car within its lane
+        # to (time it entered the network, route so far, free travel time so far)
+        cars = [[{} for _ in range(sim.nrLanes)] for sim in self.nodes]
+        for node, sim in enumerate(self.nodes):
+            sim.start(results[node], NodeFES(self.fes, node))
+            for lane in self.sourceLanes(node):
+                self.fes.add(sim.nextArrival(lane, 0), node, Event.ARRIVAL, lane, 0)
+
+        fes, nodes = self.fes, self.nodes
+        t = 0
+        while t < T:                                        # main loop
+            t, _, node, typ, lane, index = fes.next()
+            sim = nodes[node]
+            sim.t = t
+            queue = sim.queue[lane]
+            sim.res.registerQueueLength(t, len(queue) - sim.head[lane], lane)
+            if typ == Event.DEPARTURE:
+                sim.handleDeparture(lane, index)
+                entry, path, freeTime = cars[node][lane].pop(index)
+                freeTime += sim.B
+                link = self.route(node, lane)
+                if link is None:
+                    self.registerRouteDelay(path, t - entry - freeTime, freeTime)
+                else:
+                    toNode, toLane, travelTime, _ = link
+                    fes.add(t + travelTime, toNode, Event.TRANSFER, toLane, (entry, path + (toNode,), freeTime + travelTime))
+            elif typ == Event.ARRIVAL:
+                cars[node][lane][sim.base[lane] + len(queue)] = (t, (node,), 0.0)
+                sim.handleArrival(lane, index)
+            else:                                           # a car from upstream, index holds its entry in cars
+                cars[node][lane][sim.base[lane] + len(queue)] = index
+                sim.addCar(lane)
+        self.t = t
+        for sim in nodes:
+            if sim.trace is not None:
+                sim.trace.flush()
+        return results
+
+    def registerRouteDelay(self, path, delay, freeTime):
+        res = self.routeResults.get(path)
+        if res is None:
+            res = self.routeResults[path] = StreamingSimResults(1)
+            self.routeFreeTime[path] = freeTime
+        res.registerWaitingTime(delay, 0)
+
+    def routeTable(self):
+        """The number of cars, free travel time and delay statistics of every route, as a DataFrame"""
+        rows = []
+        for path, res in sorted(self.routeResults.items()):
+            rows.append({'route': '-'.join(map(str, path)), 'cars': res.nW[0], 'freeTime': self.routeFreeTime[path],
+                         'meanDelay': res.getMeanWaitingTime(0), 'sdDelay': np.sqrt(res.getVarianceWaitingTime(0)),
+                         'p95Delay': res.getWaitingTimeQuantile(0.95, 0)})
+        return pd.DataFrame(rows)
+
+
+def corridor(nrNodes, travelTime, alpha, mu, policy=FCFSPolicy, seed=None, turnIn=0.0):
+    """A Network of nrNodes intersections in a row, each with two lanes: lane 0 is the main
+    road, lane 1 a side street. Cars enter the main road at intersection 0 and go through
+    all intersections; at every intersection side street cars arrive, and a fraction turnIn
+    of them turns onto the main road towards the next intersection, the others cross it.
+    alpha and mu are the parameters of the two lanes, policy makes the policy of an
+    intersection. Every intersection gets its own random stream of SeedSequence(seed)."""
+    seeds = np.random.SeedSequence(seed).spawn(nrNodes + 1)
+    nodes = [IntersectionSimulation(BunchedExpSampler(seed=seeds[i]), 2, False, alpha, mu, policy()) for i in range(nrNodes)]
+    network = Network(nodes, seed=seeds[-1])
+    for i in range(nrNodes - 1):
+        network.connect(i, 0, i + 1, 0, travelTime)
+        if turnIn > 0:
+            network.connect(i, 1, i + 1, 0, travelTime, turnIn)
+    return network
+
+
+if __name__ == '__main__':
+    # alpha and mu were determined before, using the estimateParameters() function
+    alpha0, alpha1, mu0, mu1 = 0.5995995995995996, 0.5725725725725725, 0.21564291046984274, 0.3102950696782692
+
+    # a corridor of 5 intersections, 300 m apart (about 23 s at 13 m/s)
+    network = corridor(5, 23, [alpha0, alpha1], [mu0, mu1], seed=2023)
+    results = network.simulate(10000)
+    for node, res in enumerate(results):
+        print(f'intersection {node}: mean waiting time per lane {[res.getMeanWaitingTime(lane) for lane in range(2)]}')
+    print(network.routeTable().to_string())
+
+    # the event loop does not depend on the size of the network
+    for nrNodes in [10, 100, 500]:
+        network = corridor(nrNodes, 23, [alpha0, alpha1], [mu0, mu1], seed=2023)
+        start = time.perf_counter()
+        results = network.simulate(2000, [StreamingSimResults(2) for _ in range(nrNodes)])
+        wallTime = time.perf_counter() - start
+        nrEvents = sum(sum(res.nQ) for res in results)
+        print(f'{nrNodes} intersections: {nrEvents:,} events in {wallTime:.2f} s, {nrEvents / wallTime:,.0f} events/sec')
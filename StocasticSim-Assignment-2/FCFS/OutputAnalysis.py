@@ -0,0 +1,127 @@
+from statistics import NormalDist
+
+import numpy as np
+
+from Replications import runReplications
+
+
+def tQuantile(p, df):
+    """p-quantile of the Student t distribution with df degrees of freedom
+    (Cornish-Fisher expansion around the normal quantile, accurate to about 1e-3 for df >= 3)"""
+    z = NormalDist().inv_cdf(p)
+    g1 = (z**3 + z) / 4
+    g2 = (5 * z**5 + 16 * z**3 + 3 * z) / 96
+    g3 = (3 * z**7 + 19 * z**5 + 17 * z**3 - 15 * z) / 384
+    g4 = (79 * z**9 + 776 * z**7 + 1482 * z**5 - 1920 * z**3 - 945 * z) / 92160
+    return z + g1 / df + g2 / df**2 + g3 / df**3 + g4 / df**4
+
+
+def confidenceInterval(samples, level=0.95):
+    """Mean and half-width of the t confidence interval for the mean of independent samples,
+    for example the mean waiting times of independent replications"""
+    samples = np.asarray(samples, dtype=float)
+    n = len(samples)
+    if n < 2:
+        return float(np.mean(samples)) if n else np.nan, np.inf
+    halfWidth = tQuantile(0.5 + level / 2, n - 1) * np.std(samples, ddof=1) / np.sqrt(n)
+    return float(np.mean(samples)), float(halfWidth)
+
+
+def batchMeans(samples, nrBatches=20):
+    """Means of nrBatches consecutive batches of equal size (the last samples that do not fill a batch are dropped)"""
+    samples = np.asarray(samples, dtype=float)
+    size = len(samples) // nrBatches
+    return samples[:size * nrBatches].reshape(nrBatches, size).mean(axis=1)
+
+
+def batchMeansCI(samples, nrBatches=20, level=0.95):
+    """Confidence interval (mean, half-width) for the mean of one long, correlated run,
+    with the method of batch means"""
+    if len(samples) < nrBatches:
+        return np.nan, np.inf
+    return confidenceInterval(batchMeans(samples, nrBatches), level)
+
+
+def mser5(samples):
+    """Warm-up period of a run with the MSER-5 rule: the samples are averaged in batches of 5
+    and the number of batches d that is deleted minimises the MSER statistic
+    sum_{i>d} (Z_i - mean(Z_{d+1..m}))^2 / (m-d)^2, over d <= m/2.
+    Returns the number of samples to delete from the start of the run."""
+    samples = np.asarray(samples, dtype=float)
+    m = len(samples) // 5
+    if m < 2:
+        return 0
+    Z = samples[:5 * m].reshape(m, 5).mean(axis=1)
+    # sums of Z and Z^2 over the batches d+1..m, for every d
+    tailSum = np.cumsum(Z[::-1])[::-1]
+    tailSum2 = np.cumsum((Z * Z)[::-1])[::-1]
+    k = m - np.arange(m)                    # number of batches that are kept
+    mser = (tailSum2 - tailSum**2 / k) / k**2
+    d = int(np.argmin(mser[:m // 2 + 1]))
+    return 5 * d
+
+
+def relativeHalfWidth(mean, halfWidth):
+    return halfWidth / abs(mean) if mean != 0 else np.inf
+
+
+def sequentialRun(sim, T0, relPrecision=0.05, maxT=1e7, nrBatches=20, level=0.95):
+    """Simulate one long run until the batch-means confidence interval of the mean
+    waiting time of every lane has a relative half-width of at most relPrecision.
+
+    The run starts with horizon T0 and the horizon is doubled until the precision
+    is reached (or maxT is exceeded). Every time, the warm-up is removed with MSER-5
+    first. The arrivals of sim should come from a BunchedExpSampler, which is reset
+    with the SeedSequence of its seed before every run, or a TraceReplay, which is
+    restarted with the same seed before every run (a bootstrapped one with a new seed
+    if it has none); so a longer run continues the shorter one.
+
+    Returns (res, T, ci) with ci[lane] = (mean, half-width, deleted warm-up samples)."""
+    T = T0
+    if hasattr(sim.arrDist, 'reset'):
+        seed = sim.arrDist.fixSeed(sim.arrDist.seed)
+    elif hasattr(sim.arrDist, 'restart'):
+        seed = sim.arrDist.seed if sim.arrDist.seed is not None else np.random.SeedSequence()
+    while True:
+        if hasattr(sim.arrDist, 'reset'):
+            sim.arrDist.reset(seed)
+        elif hasattr(sim.arrDist, 'restart'):
+            sim.arrDist.restart(seed)
+        res = sim.simulate(T)
+        ci = []
+        for lane in range(sim.nrLanes):
+            w = np.asarray(res.getWaitingTimes(lane), dtype=float)
+            d = mser5(w)
+            mean, halfWidth = batchMeansCI(w[d:], nrBatches, level)
+            ci.append((mean, halfWidth, d))
+        if all(relativeHalfWidth(mean, halfWidth) <= relPrecision for mean, halfWidth, _ in ci) or 2 * T > maxT:
+            return res, T, ci
+        T *= 2
+
+
+def sequentialReplications(simClass, nrLanes, T, alpha=None, mu=None, arrivals=None, relPrecision=0.05,
+                           n0=20, maxN=100000, seed=None, maxWorkers=None, level=0.95):
+    """Perform replications of length T until the t confidence interval of the mean
+    waiting time of every lane has a relative half-width of at most relPrecision
+    (or maxN replications were done). Replications are done in rounds with
+    runReplications; after a round the number of replications that is still needed
+    is estimated from the current half-width. Replication i always gets the i-th
+    stream of SeedSequence(seed), so the result does not depend on the rounds.
+
+    Returns (meanW, meanQL, ci): the replication means per lane as in
+    runReplications and ci[lane] = (mean, half-width) of the mean waiting time."""
+    seedSeq = np.random.SeedSequence(seed)
+    meanW = np.zeros((nrLanes, 0))
+    meanQL = np.zeros((nrLanes, 0))
+    n = n0
+    while True:
+        W, QL = runReplications(simClass, nrLanes, T, n, alpha, mu, arrivals, seedSeq, maxWorkers)
+        meanW = np.concatenate((meanW, W), axis=1)
+        meanQL = np.concatenate((meanQL, QL), axis=1)
+        ci = [confidenceInterval(meanW[lane], level) for lane in range(nrLanes)]
+        done = meanW.shape[1]
+        worst = max(relativeHalfWidth(mean, halfWidth) for mean, halfWidth in ci)
+        if worst <= relPrecision or done >= maxN:
+            return meanW, meanQL, ci
+        needed = int(np.ceil(done * (worst / relPrecision) ** 2)) if np.isfinite(worst) else 2 * done
+        n = min(max(needed - done, n0), maxN - done)
@@ -0,0 +1,130 @@
+from heapq import heappush, heappop
+
+
+class Policy:
+    """A service policy decides which lane the server serves next. selectLane is
+    called whenever the server is free and at least one car is waiting;
+    startTime gives the time at which the selected car may start service.
+    arrival and departure are called after a car joined or left the queue of a
+    lane, for policies that keep their own index of the lanes."""
+
+    def reset(self, sim):
+        pass
+
+    def arrival(self, sim, lane):
+        pass
+
+    def departure(self, sim, lane):
+        pass
+
+    def selectLane(self, sim):
+        raise NotImplementedError
+
+    def startTime(self, sim, lane):
+        return sim.t
+
+    def nextNonEmptyLane(self, sim, lane):
+        """First lane from lane onwards (cyclic) that has a car waiting, from the bitset sim.nonEmpty"""
+        lane %= sim.nrLanes
+        after = sim.nonEmpty >> lane
+        if after:
+            return lane + (after & -after).bit_length() - 1     # lowest set bit
+        if sim.nonEmpty:
+            return (sim.nonEmpty & -sim.nonEmpty).bit_length() - 1
+
+
+class FCFSPolicy(Policy):
+    """Serve the car that arrived first, over all lanes. The first waiting car of every
+    lane is kept in a heap of (arrival time, lane), so a choice takes O(log nrLanes)"""
+
+    def reset(self, sim):
+        self.heads = []
+
+    def arrival(self, sim, lane):
+        if sim.queueLength(lane) == 1:                  # the car is the first of its lane
+            heappush(self.heads, (sim.headArrival(lane), lane))
+
+    def departure(self, sim, lane):
+        if sim.queueLength(lane) > 0:                   # the next car of the lane is first now
+            heappush(self.heads, (sim.headArrival(lane), lane))
+
+    def selectLane(self, sim):
+        return heappop(self.heads)[1]                   # until it departs, the lane has no waiting car in the heap
+
+
+class ExhaustivePolicy(Policy):
+    """Keep serving a lane until it is empty, then switch to the next lane (cyclic) with a car waiting"""
+
+    def selectLane(self, sim):
+        lane = sim.lastDepLane if sim.lastDepLane != sim.NO_LANE else 0
+        return self.nextNonEmptyLane(sim, lane)
+
+
+class KLimitedPolicy(Policy):
+    """Serve at most k cars of a lane per visit, then switch to the next lane (cyclic) with a car waiting"""
+
+    def __init__(self, k):
+        self.k = k
+
+    def reset(self, sim):
+        self.budget = 0  # cars we may still serve in the current visit
+
+    def visitSize(self, sim, lane):
+        return self.k
+
+    def selectLane(self, sim):
+        lane = sim.lastDepLane
+        if lane != sim.NO_LANE and self.budget > 0 and sim.queueLength(lane) > 0:
+            self.budget -= 1
+            return lane
+        lane = self.nextNonEmptyLane(sim, 0 if lane == sim.NO_LANE else lane + 1)
+        self.budget = self.visitSize(sim, lane) - 1
+        return lane
+
+
+class GatedPolicy(KLimitedPolicy):
+    """Serve only the cars that were waiting in a lane when the server got there, then switch lanes (cyclic)"""
+
+    def __init__(self):
+        KLimitedPolicy.__init__(self, None)
+
+    def visitSize(self, sim, lane):
+        return sim.queueLength(lane)
+
+
+class FixedCyclePolicy(Policy):
+    """Traffic light with a fixed cycle: the lanes get green one after the other, for
+    greenTimes[lane] seconds each, with an all-red clearance time between the phases.
+    A car can only start service while its lane has green; the server takes the
+    waiting lane that gets green first."""
+
+    def __init__(self, greenTimes, clearance=0):
+        self.greenTimes = list(greenTimes)
+        self.clearance = clearance
+        self.cycleLength = sum(self.greenTimes) + len(self.greenTimes) * clearance
+        self.greenStart = []    # start of the green phase of every lane, within the cycle
+        start = 0
+        for green in self.greenTimes:
+            self.greenStart.append(start)
+            start += green + clearance
+
+    def nextGreen(self, lane, t):
+        """First time from t onwards at which the lane has green"""
+        u = (t - self.greenStart[lane]) % self.cycleLength
+        if u < self.greenTimes[lane]:
+            return t
+        return t + self.cycleLength - u
+
+    def selectLane(self, sim):
+        first, firstGreen = None, None
+        lanes = sim.nonEmpty
+        while lanes:                                     # the lanes with a car, from low to high
+            lane = (lanes & -lanes).bit_length() - 1
+            lanes &= lanes - 1
+            green = self.nextGreen(lane, sim.t)
+            if first is None or green < firstGreen:
+                first, firstGreen = lane, green
+        return first
+
+    def startTime(self, sim, lane):
+        return self.nextGreen(lane, sim.t)
@@ -0,0 +1,219 @@
+import numpy as np
+
+
+class QueueLengthRecorder:
+    """Records how the queue length of every lane evolves, next to the statistics of a
+    results object res (such as a StreamingSimResults) that it passes everything on to:
+
+        rec = QueueLengthRecorder(StreamingSimResults(2), window=60, threshold=20)
+        sim.simulate(T, rec)
+
+    The queue length of a lane is stored run-length encoded: only the times at which it
+    changes and the new values, as numpy arrays of BLOCK_SIZE changes (12 bytes per change).
+    With keepChanges=False nothing is stored per change. For every window of `window`
+    time units from start the mean and largest queue length and the time the queue length
+    is above threshold (a number, or one per lane) are accumulated while simulating, so
+    they cost a few bytes per window."""
+
+    BLOCK_SIZE = 65536
+
+    def __init__(self, res, window=60.0, threshold=None, keepChanges=True, start=0.0):
+        self.res = res
+        self.nrLanes = res.nrLanes
+        self.window = window
+        self.start = start
+        if threshold is None or np.isscalar(threshold):
+            threshold = [np.inf if threshold is None else threshold] * self.nrLanes
+        self.threshold = list(threshold)
+        self.keepChanges = keepChanges
+        self.lastTime = [start] * self.nrLanes
+        self.value = [None] * self.nrLanes                  # the current queue length of every lane
+        self.changeTimes = [[] for _ in range(self.nrLanes)]   # changes that are not in a block yet
+        self.changeValues = [[] for _ in range(self.nrLanes)]
+        self.blocks = [[] for _ in range(self.nrLanes)]        # (times, values) arrays
+        # per lane and window: integral of the queue length, time covered, largest queue length, time above threshold
+        self.integral = [[] for _ in range(self.nrLanes)]
+        self.covered = [[] for _ in range(self.nrLanes)]
+        self.maximum = [[] for _ in range(self.nrLanes)]
+        self.above = [[] for _ in range(self.nrLanes)]
+
+    def registerQueueLength(self, time, ql, lane):
+        self.res.registerQueueLength(time, ql, lane)
+        last = self.lastTime[lane]                          # ql is the queue length from last until time
+        if ql != self.value[lane]:
+            self.value[lane] = ql
+            if self.keepChanges:
+                self.changeTimes[lane].append(last)
+                self.changeValues[lane].append(ql)
+                if len(self.changeTimes[lane]) >= self.BLOCK_SIZE:
+                    self.flush(lane)
+        self.lastTime[lane] = time
+        if time > last:
+            self.addInterval(lane, last, time, ql)
+
+    def registerQueueLengths(self, times, qls, lane):
+        """The same as registerQueueLength for every event, with array operations"""
+        times = np.asarray(times, dtype=float)
+        if len(times) == 0:
+            return
+        qls = np.asarray(qls, dtype=int)
+        self.res.registerQueueLengths(times, qls, lane)
+        starts = np.concatenate(([self.lastTime[lane]], times[:-1]))
+        if self.keepChanges:
+            previous = np.concatenate(([-1 if self.value[lane] is None else self.value[lane]], qls[:-1]))
+            changed = qls != previous
+            self.flush(lane)
+            self.blocks[lane].append((starts[changed], qls[changed].astype(np.int32)))
+        self.value[lane] = int(qls[-1])
+        self.lastTime[lane] = float(times[-1])
+
+        # intervals within one window are added per window at once, the others one by one
+        durations = times - starts
+        first = ((starts - self.start) // self.window).astype(int)
+        inside = (times - self.start <= (first + 1) * self.window) & (durations > 0)
+        if inside.any():
+            self.ensureWindows(lane, int(first[inside].max()))
+            nrWindows = len(self.integral[lane])
+            w, d, q = first[inside], durations[inside], qls[inside]
+            integral = np.bincount(w, weights=q * d, minlength=nrWindows)
+            covered = np.bincount(w, weights=d, minlength=nrWindows)
+            above = np.bincount(w, weights=d * (q > self.threshold[lane]), minlength=nrWindows)
+            maximum = np.full(nrWindows, -1)
+            np.maximum.at(maximum, w, q)
+            for k in np.unique(w).tolist():
+                self.integral[lane][k] += float(integral[k])
+                self.covered[lane][k] += float(covered[k])
+                self.above[lane][k] += float(above[k])
+                self.maximum[lane][k] = max(self.maximum[lane][k], int(maximum[k]))
+        for k in np.flatnonzero(~inside & (durations > 0)).tolist():
+            self.addInterval(lane, float(starts[k]), float(times[k]), int(qls[k]))
+
+    def registerWaitingTime(self, w, lane):
+        self.res.registerWaitingTime(w, lane)
+
+    def registerWaitingTimes(self, ws, lane):
+        self.res.registerWaitingTimes(ws, lane)
+
+    def __getattr__(self, name):
+        if name == 'res':                                   # not set yet, while unpickling
+            raise AttributeError(name)
+        return getattr(self.res, name)
+
+    def ensureWindows(self, lane, k):
+        """Make sure window k of lane exists"""
+        missing = k + 1 - len(self.integral[lane])
+        if missing > 0:
+            self.integral[lane].extend([0.0] * missing)
+            self.covered[lane].extend([0.0] * missing)
+            self.maximum[lane].extend([-1] * missing)     # -1: the window was not covered
+            self.above[lane].extend([0.0] * missing)
+
+    def addInterval(self, lane, t0, t1, ql):
+        """The queue length of lane was ql from t0 until t1"""
+        k = int((t0 - self.start) // self.window)
+        self.ensureWindows(lane, int((t1 - self.start) // self.window))
+        integral, covered, maximum, above = self.integral[lane], self.covered[lane], self.maximum[lane], self.above[lane]
+        isAbove = ql > self.threshold[lane]
+        while t0 < t1:
+            end = min(t1, self.start + (k + 1) * self.window)
+            duration = end - t0
+            integral[k] += ql * duration
+            covered[k] += duration
+            if ql > maximum[k]:
+                maximum[k] = ql
+            if isAbove:
+                above[k] += duration
+            t0 = end
+            k += 1
+
+    def flush(self, lane):
+        if self.changeTimes[lane]:
+            self.blocks[lane].append((np.array(self.changeTimes[lane]), np.array(self.changeValues[lane], dtype=np.int32)))
+            self.changeTimes[lane], self.changeValues[lane] = [], []
+
+    def changes(self, lane):
+        """(times, values): from times[k] on the queue length of lane was values[k], the last
+        value holds until the last registered event. Values that held for no time at all
+        (events at the same time) are left out."""
+        if not self.keepChanges:
+            raise ValueError('The changes are not kept, use QueueLengthRecorder(res, keepChanges=True)')
+        self.flush(lane)
+        if not self.blocks[lane]:
+            return np.empty(0), np.empty(0, dtype=np.int32)
+        times = np.concatenate([b[0] for b in self.blocks[lane]])
+        values = np.concatenate([b[1] for b in self.blocks[lane]])
+        keep = np.append(times[1:] > times[:-1], True)
+        times, values = times[keep], values[keep]
+        keep = np.concatenate(([True], values[1:] != values[:-1]))
+        self.blocks[lane] = [(times[keep], values[keep])]      # one block from now on
+        return self.blocks[lane][0]
+
+    def queueLengthAt(self, lane, t):
+        """Queue length of lane at time(s) t, from the changes"""
+        times, values = self.changes(lane)
+        return values[np.maximum(np.searchsorted(times, t, side='right') - 1, 0)]
+
+    def windowStats(self, lane):
+        """Per window of lane: its start, the mean and largest queue length and the time
+        above the threshold (nan and -1 for a window without events)"""
+        covered = np.array(self.covered[lane])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(covered > 0, np.array(self.integral[lane]) / covered, np.nan)
+        return {'start': self.start + self.window * np.arange(len(covered)), 'mean': mean,
+                'max': np.array(self.maximum[lane]), 'timeAbove': np.array(self.above[lane]), 'covered': covered}
+
+    def peakPeriod(self, lane, length):
+        """(start, mean queue length) of the period of `length` time units (a multiple of the
+        window, starting at a window boundary) with the largest mean queue length, such as
+        the peak hour"""
+        k = max(1, int(round(length / self.window)))
+        integral = np.concatenate(([0.0], np.cumsum(self.integral[lane])))
+        covered = np.concatenate(([0.0], np.cumsum(self.covered[lane])))
+        if len(integral) <= k:
+            return self.start, integral[-1] / covered[-1] if covered[-1] > 0 else np.nan
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = (integral[k:] - integral[:-k]) / (covered[k:] - covered[:-k])
+        best = int(np.nanargmax(means))
+        return self.start + best * self.window, float(means[best])
+
+    def nbytes(self):
+        """Memory used by the changes and the windows, roughly"""
+        changes = sum(t.nbytes + v.nbytes for blocks in self.blocks for t, v in blocks)
+        pending = 12 * sum(len(times) for times in self.changeTimes)
+        return changes + pending + 32 * sum(len(windows) for windows in self.integral)
+
+    def save(self, path):
+        """Store the changes and window statistics of every lane in a compressed .npz file"""
+        arrays = {}
+        for lane in range(self.nrLanes):
+            if self.keepChanges:
+                arrays[f'times{lane}'], arrays[f'values{lane}'] = self.changes(lane)
+            for name, values in self.windowStats(lane).items():
+                arrays[f'{name}{lane}'] = values
+        np.savez_compressed(path, window=self.window, threshold=self.threshold, **arrays)
+
+
+if __name__ == '__main__':
+    import time
+
+    from BunchedExponential import BunchedExpSampler
+    from FCFSSimulation import FCFSSimulation
+    from SimResults import StreamingSimResults
+
+    # two lanes with 0.2 cars per second each, about a million events; windows of 5 minutes
+    alpha, rate = 0.6, 0.2
+    mu = alpha / (1 / rate - 1)
+    for fast in [True, False]:
+        sim = FCFSSimulation(BunchedExpSampler(seed=2023), 2, False, [alpha, alpha], [mu, mu])
+        rec = QueueLengthRecorder(StreamingSimResults(2), window=300, threshold=10)
+        start = time.perf_counter()
+        sim.simulate_fast(1200000, rec) if fast else sim.simulate(1200000, rec)
+        print(f"{'simulate_fast' if fast else 'simulate'}: {sum(rec.nQ):,} events in {time.perf_counter() - start:.1f} s, "
+              f'recorded in {rec.nbytes() / 2**20:.1f} MiB')
+        for lane in range(2):
+            times, values = rec.changes(lane)
+            stats = rec.windowStats(lane)
+            peakStart, peakMean = rec.peakPeriod(lane, 3600)
+            print(f'  lane {lane}: {len(times):,} changes, mean queue length {rec.getMeanQueueLength(lane):.3f}, '
+                  f'busiest hour from t = {peakStart:.0f} (mean {peakMean:.2f}), longest queue {stats["max"].max()}, '
+                  f'{100 * stats["timeAbove"].sum() / stats["covered"].sum():.2f}% of the time above 10 cars')
@@ -0,0 +1,48 @@
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import os
+
+import numpy as np
+
+from BunchedExponential import BunchedExpSampler
+
+
+def runReplication(simClass, nrLanes, T, alpha, mu, arrivals, seed, antithetic=False):
+    """Perform one simulation run and return the mean waiting time and the mean
+    queue length of every lane. With arrivals (a list of arrival times per lane, or
+    a TraceReplay) the data is replayed or bootstrapped, else the interarrival times are drawn with a
+    BunchedExpSampler that is seeded with seed (and uses 1-U with antithetic=True)."""
+    if arrivals is not None:
+        sim = simClass(arrivals, nrLanes, True)
+        sim.arrDist.restart(seed)  # a TraceReplay with bootstrap=True resamples the data with this stream
+    else:
+        sim = simClass(BunchedExpSampler(seed=seed, antithetic=antithetic), nrLanes, False, alpha, mu)
+    res = sim.simulate(T)
+    meanW = [res.getMeanWaitingTime(lane) for lane in range(nrLanes)]
+    meanQL = [res.getMeanQueueLength(lane) for lane in range(nrLanes)]
+    return meanW, meanQL
+
+
+def runReplications(simClass, nrLanes, T, n, alpha=None, mu=None, arrivals=None, seed=None, maxWorkers=None):
+    """Perform n independent simulation runs of length T on a process pool.
+
+    Replication i gets the i-th stream of numpy.random.SeedSequence(seed).spawn(n),
+    so for a given seed the results are the same no matter how many workers
+    are used. seed can also be a SeedSequence, to continue with new streams.
+    maxWorkers=1 runs everything in this process.
+
+    Returns (meanW, meanQL): arrays of shape (nrLanes, n), so meanW[lane] holds
+    the mean waiting times of that lane over the replications."""
+    seedSeq = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    seeds = seedSeq.spawn(n)  # a SeedSequence that was used before gives new streams
+    args = (repeat(simClass), repeat(nrLanes), repeat(T), repeat(alpha), repeat(mu), repeat(arrivals), seeds)
+    if maxWorkers == 1:
+        results = list(map(runReplication, *args))
+    else:
+        maxWorkers = maxWorkers or os.cpu_count()
+        chunksize = max(1, n // (4 * maxWorkers))  # a few chunks per worker, to keep the pickling overhead low
+        with ProcessPoolExecutor(max_workers=maxWorkers) as pool:
+            results = list(pool.map(runReplication, *args, chunksize=chunksize))  # map keeps the order of the replications
+    meanW = np.array([r[0] for r in results], dtype=float).T
+    meanQL = np.array([r[1] for r in results], dtype=float).T
+    return meanW, meanQL
@@ -0,0 +1,111 @@
+"""Campaigns of replications split over several machines that share a file system.
+
+    python Shards.py run shards --first 0 --count 50 [--T 10000] [--lanes 2] [--seed 2023] [--scenario '{"policy": "exhaustive"}']
+    python Shards.py aggregate shards [--level 0.95]
+
+run performs replications first, ..., first+count-1 of a scenario (see Sweep.scenarioGrid;
+replication i uses the i-th stream of SeedSequence(seed), so the shards can be run anywhere
+and in any order) and writes one shard file with the merged StreamingSimResults of these
+replications and the mean waiting time and queue length of every replication. aggregate
+merges all shard files of a directory into the pooled statistics and computes confidence
+intervals from the replication means; no individual waiting times are stored."""
+import argparse
+import glob
+import json
+import os
+import sys
+
+import numpy as np
+
+from OutputAnalysis import confidenceInterval
+from SimResults import RESULT_CLASSES, StreamingSimResults
+from Sweep import codeVersion, normalize, simulateScenario
+
+
+def runShard(directory, first, count, T, nrLanes=2, seed=2023, scenario=None):
+    """Perform replications first, ..., first+count-1 and store them as a shard in directory;
+    returns the path of the shard file"""
+    scenario = normalize(scenario or {})
+    pooled = StreamingSimResults(nrLanes)
+    meanW, meanQL = [], []
+    for i in range(first, first + count):
+        res = simulateScenario(scenario, nrLanes, T, np.random.SeedSequence(seed, spawn_key=(i,)), StreamingSimResults(nrLanes))
+        meanW.append([res.getMeanWaitingTime(lane) for lane in range(nrLanes)])
+        meanQL.append([res.getMeanQueueLength(lane) for lane in range(nrLanes)])
+        pooled.merge(res)
+    meta = {'scenario': scenario, 'nrLanes': nrLanes, 'T': T, 'seed': seed, 'code': codeVersion()}
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'shard-{first:06d}-{first + count - 1:06d}.npz')
+    with open(path + '.tmp', 'wb') as f:
+        np.savez_compressed(f, kind=type(pooled).__name__, meta=json.dumps(meta, sort_keys=True),
+                            replications=np.arange(first, first + count), meanW=np.array(meanW), meanQL=np.array(meanQL),
+                            **{'res.' + key: value for key, value in pooled.state().items()})
+    os.replace(path + '.tmp', path)     # no half-written shards if a run is interrupted
+    return path
+
+
+def loadShard(path):
+    """(meta, replications, meanW, meanQL, results) of a shard file"""
+    with np.load(path) as f:
+        data = dict(f)
+    state = {key[4:]: value for key, value in data.items() if key.startswith('res.')}
+    res = RESULT_CLASSES[str(data['kind'])].fromState(state)
+    return json.loads(str(data['meta'])), data['replications'], data['meanW'], data['meanQL'], res
+
+
+def aggregateShards(directory):
+    """Merge the shards of a directory. Returns (meta, pooled results, meanW, meanQL) where
+    meanW and meanQL have shape (nrLanes, n), like runReplications."""
+    paths = sorted(glob.glob(os.path.join(directory, 'shard-*.npz')))
+    if not paths:
+        raise FileNotFoundError(f'No shards in {directory}')
+    meta, pooled, seen, meanW, meanQL = None, None, set(), [], []
+    for path in paths:
+        shardMeta, replications, W, QL, res = loadShard(path)
+        if meta is None:
+            meta, pooled = shardMeta, res
+        else:
+            if shardMeta != meta:
+                raise ValueError(f'{path} belongs to another campaign (scenario, horizon, seed or code)')
+            pooled.merge(res)
+        duplicates = seen.intersection(replications.tolist())
+        if duplicates:
+            raise ValueError(f'{path} repeats replications {sorted(duplicates)}')
+        seen.update(replications.tolist())
+        meanW.append(W)
+        meanQL.append(QL)
+    return meta, pooled, np.concatenate(meanW).T, np.concatenate(meanQL).T
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replications split over shard files')
+    commands = parser.add_subparsers(dest='command', required=True)
+    run = commands.add_parser('run', help='perform a range of replications and write a shard')
+    run.add_argument('directory')
+    run.add_argument('--first', type=int, required=True)
+    run.add_argument('--count', type=int, required=True)
+    run.add_argument('--T', type=float, default=10000)
+    run.add_argument('--lanes', type=int, default=2)
+    run.add_argument('--seed', type=int, default=2023)
+    run.add_argument('--scenario', type=json.loads, default={}, help='parameters that differ from Sweep.DEFAULT_SCENARIO, as JSON')
+    agg = commands.add_parser('aggregate', help='pool the shards of a directory')
+    agg.add_argument('directory')
+    agg.add_argument('--level', type=float, default=0.95)
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        print(runShard(args.directory, args.first, args.count, args.T, args.lanes, args.seed, args.scenario))
+        return 0
+    meta, pooled, meanW, meanQL = aggregateShards(args.directory)
+    print(f"{meanW.shape[1]} replications of T = {meta['T']:g}, scenario {meta['scenario']}")
+    for lane in range(meta['nrLanes']):
+        w, hW = confidenceInterval(meanW[lane], args.level)
+        ql, hQL = confidenceInterval(meanQL[lane], args.level)
+        print(f'lane {lane}: mean waiting time {w:.3f} +- {hW:.3f}, mean queue length {ql:.3f} +- {hQL:.3f}, '
+              f'sd waiting time {np.sqrt(pooled.getVarianceWaitingTime(lane)):.3f}, '
+              f'95% quantile {pooled.getWaitingTimeQuantile(0.95, lane):.3f}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,9 +1,13 @@
 from collections import deque
+from copy import deepcopy
 
 from numpy.ma.core import zeros, sqrt
+import numpy as np
 
 import matplotlib.pyplot as plt
 
+from StreamingStats import P2Quantile, LogHistogram
+
 
 class SimResults:
     
@@ -15,6 +19,7 @@ class SimResults:
         self.sumQL2 = zeros(nrLanes)
         self.nQ = zeros(nrLanes)
         self.oldTime = zeros(nrLanes)
+        self.mergedTime = zeros(nrLanes)        # time observed by the results that were merged into these
         self.queueLengthHistogram = [zeros(self.MAX_QL + 1) for _ in range(nrLanes)] 
         self.sumW = zeros(nrLanes)
         self.sumW2 = zeros(nrLanes)
@@ -34,11 +39,88 @@ class SimResults:
         self.sumW[lane] += w
         self.sumW2[lane] += w * w
         
+    def registerQueueLengths(self, times, qls, lane):
+        """Register a sorted array of event times at once, qls holds the queue length just before each event.
+        This gives the same statistics as calling registerQueueLength for every event."""
+        times = np.asarray(times, dtype=float)
+        if len(times) == 0:
+            return
+        qls = np.asarray(qls, dtype=int)
+        dt = np.diff(times, prepend=self.oldTime[lane])
+        self.sumQL[lane] += np.dot(qls, dt)
+        self.sumQL2[lane] += np.dot(qls * qls, dt)
+        self.queueLengthHistogram[lane] += np.bincount(np.minimum(qls, self.MAX_QL), weights=dt, minlength=self.MAX_QL + 1)
+        self.oldTime[lane] = times[-1]
+        self.nQ[lane] += len(times)
+
+    def registerWaitingTimes(self, ws, lane):
+        """Register an array of waiting times at once, in the order the customers are served"""
+        ws = np.asarray(ws, dtype=float)
+        self.waitingTimes[lane].extend(ws.tolist())
+        self.nW[lane] += len(ws)
+        self.sumW[lane] += ws.sum()
+        self.sumW2[lane] += np.dot(ws, ws)
+
+    def merge(self, other):
+        """Add the statistics of other (results of the same lanes, for example of another
+        replication) to these. The queue-length statistics are then averages over the
+        total observed time; events registered afterwards continue the own run."""
+        if type(other) is not type(self) or other.nrLanes != self.nrLanes:
+            raise TypeError('Only results of the same class and number of lanes can be merged')
+        self.sumQL += other.sumQL
+        self.sumQL2 += other.sumQL2
+        self.nQ += other.nQ
+        self.mergedTime += other.oldTime + other.mergedTime
+        for lane in range(self.nrLanes):
+            self.queueLengthHistogram[lane] += other.queueLengthHistogram[lane]
+            self.waitingTimes[lane].extend(other.waitingTimes[lane])
+        self.sumW += other.sumW
+        self.sumW2 += other.sumW2
+        self.nW += other.nW
+        return self
+
+    def state(self, waitingTimes=False):
+        """The statistics as a dict of arrays, see save; the individual waiting times are
+        only included with waitingTimes=True"""
+        hist = np.array(self.queueLengthHistogram)
+        used = np.flatnonzero(hist.any(axis=0))
+        state = {'nrLanes': self.nrLanes, 'sumQL': self.sumQL, 'sumQL2': self.sumQL2, 'nQ': self.nQ,
+                 'oldTime': self.oldTime, 'mergedTime': self.mergedTime, 'queueLengthHistogram': hist[:, :used[-1] + 1 if len(used) else 0],
+                 'sumW': self.sumW, 'sumW2': self.sumW2, 'nW': self.nW}
+        if waitingTimes:
+            state['waitingTimeCounts'] = [len(ws) for ws in self.waitingTimes]
+            state['waitingTimes'] = np.concatenate([np.array(ws, dtype=float) for ws in self.waitingTimes])
+        return {key: np.asarray(value) for key, value in state.items()}
+
+    @classmethod
+    def fromState(cls, state):
+        res = cls(int(state['nrLanes']))
+        for key in ['sumQL', 'sumQL2', 'nQ', 'oldTime', 'sumW', 'sumW2', 'nW']:
+            getattr(res, key)[:] = state[key]
+        if 'mergedTime' in state:
+            res.mergedTime[:] = state['mergedTime']
+        hist = state['queueLengthHistogram']
+        for lane in range(res.nrLanes):
+            res.queueLengthHistogram[lane][:hist.shape[1]] = hist[lane]
+        if 'waitingTimes' in state:
+            ends = np.cumsum(state['waitingTimeCounts'])
+            for lane in range(res.nrLanes):
+                res.waitingTimes[lane].extend(state['waitingTimes'][ends[lane] - state['waitingTimeCounts'][lane]:ends[lane]].tolist())
+        return res
+
+    def save(self, path, waitingTimes=False):
+        """Store the results in a compressed .npz file, to be read with loadResults"""
+        np.savez_compressed(path, kind=type(self).__name__, **self.state(waitingTimes))
+
+    def getObservedTime(self, lane):
+        """Time over which the queue length of lane was registered, including merged results"""
+        return self.oldTime[lane] + self.mergedTime[lane]
+
     def getMeanQueueLength(self, lane): 
-        return self.sumQL[lane] / self.oldTime[lane]
+        return self.sumQL[lane] / self.getObservedTime(lane)
     
     def getVarianceQueueLength(self, lane): 
-        return self.sumQL2[lane] / self.oldTime[lane] - self.getMeanQueueLength(lane)**2
+        return self.sumQL2[lane] / self.getObservedTime(lane) - self.getMeanQueueLength(lane)**2
     
     def getMeanWaitingTime(self, lane):
         return self.sumW[lane] / self.nW[lane]
@@ -47,7 +129,7 @@ class SimResults:
         return self.sumW2[lane] / self.nW[lane] - self.getMeanWaitingTime(lane)**2
 
     def getQueueLengthHistogram(self, lane) :
-        return [x/self.oldTime[lane] for x in self.queueLengthHistogram[lane]]
+        return [x/self.getObservedTime(lane) for x in self.queueLengthHistogram[lane]]
     
     def getWaitingTimes(self, lane):
         return self.waitingTimes[lane]
@@ -66,7 +148,7 @@ class SimResults:
             transparency -= 0.5/self.nrLanes
             ql = self.getQueueLengthHistogram(lane)
             maxx = maxq + 1
-            plt.bar(range(0, maxx), ql[0:maxx], alpha=transparency)
+            plt.bar(range(0, len(ql[0:maxx])), ql[0:maxx], alpha=transparency)
         plt.ylabel('P(Q = k)')
         plt.xlabel('k')
         plt.legend([f'lane{i}' for i in range(self.nrLanes)])
@@ -82,8 +164,233 @@ class SimResults:
         plt.legend([f'lane{i}' for i in range(self.nrLanes)])
         plt.show()
     
+    # Note: these treat the observations of one run as independent, which they are not.
+    # For a proper confidence interval use OutputAnalysis.batchMeansCI or independent replications.
     def getConfidenceQLmean(self, lane):
-        return f'{self.getMeanQueueLength(lane)} +- {1.96*sqrt(self.getVarianceQueueLength(lane))/self.nQ[lane]}'
+        return f'{self.getMeanQueueLength(lane)} +- {1.96*sqrt(self.getVarianceQueueLength(lane)/self.nQ[lane])}'
     
     def getConfidenceWmean(self, lane):
-        return f'{self.getMeanWaitingTime(lane)} +- {1.96*sqrt(self.getVarianceWaitingTime(lane))/self.nQ[lane]}'
\ No newline at end of file
+        return f'{self.getMeanWaitingTime(lane)} +- {1.96*sqrt(self.getVarianceWaitingTime(lane)/self.nW[lane])}'
+
+
+class StreamingSimResults(SimResults):
+    """Simulation results with a memory use that does not grow with the horizon.
+
+    Waiting times are summarised by a running (Welford) mean and variance, P^2
+    estimates of the quantiles in QUANTILES and a logarithmically binned
+    histogram; queue lengths by a sparse histogram (a dict from queue length to
+    time). The individual waiting times are only kept with keepWaitingTimes=True.
+    Pass an object of this class to simulate(T, res)."""
+
+    QUANTILES = (0.5, 0.95, 0.99)
+
+    def __init__(self, nrLanes, keepWaitingTimes=False):
+        self.nrLanes = nrLanes
+        self.sumQL = [0.0] * nrLanes
+        self.sumQL2 = [0.0] * nrLanes
+        self.nQ = [0] * nrLanes
+        self.oldTime = [0.0] * nrLanes
+        self.mergedTime = [0.0] * nrLanes
+        self.queueLengthHistogram = [{} for _ in range(nrLanes)]   # queue length -> total time
+        self.nW = [0] * nrLanes
+        self.meanW = [0.0] * nrLanes
+        self.m2W = [0.0] * nrLanes                                  # sum of squared deviations from the mean
+        self.quantiles = [{p: P2Quantile(p) for p in self.QUANTILES} for _ in range(nrLanes)]
+        self.waitingTimeHistogram = [LogHistogram() for _ in range(nrLanes)]
+        self.keepWaitingTimes = keepWaitingTimes
+        self.waitingTimes = [deque() for _ in range(nrLanes)] if keepWaitingTimes else None
+        self.mergedQuantiles = [False] * nrLanes                    # lanes with the waiting times of several runs
+
+    def registerQueueLength(self, time, ql, lane):
+        dt = time - self.oldTime[lane]
+        self.sumQL[lane] += ql * dt
+        self.sumQL2[lane] += ql * ql * dt
+        hist = self.queueLengthHistogram[lane]
+        hist[ql] = hist.get(ql, 0) + dt
+        self.oldTime[lane] = time
+        self.nQ[lane] += 1
+
+    def registerQueueLengths(self, times, qls, lane):
+        times = np.asarray(times, dtype=float)
+        if len(times) == 0:
+            return
+        qls = np.asarray(qls, dtype=int)
+        dt = np.diff(times, prepend=self.oldTime[lane])
+        self.sumQL[lane] += float(np.dot(qls, dt))
+        self.sumQL2[lane] += float(np.dot(qls * qls, dt))
+        values, inverse = np.unique(qls, return_inverse=True)
+        hist = self.queueLengthHistogram[lane]
+        for ql, dtSum in zip(values.tolist(), np.bincount(inverse, weights=dt).tolist()):
+            hist[ql] = hist.get(ql, 0) + dtSum
+        self.oldTime[lane] = float(times[-1])
+        self.nQ[lane] += len(times)
+
+    def registerWaitingTime(self, w, lane):
+        if self.keepWaitingTimes:
+            self.waitingTimes[lane].append(w)
+        self.nW[lane] += 1
+        delta = w - self.meanW[lane]
+        self.meanW[lane] += delta / self.nW[lane]
+        self.m2W[lane] += delta * (w - self.meanW[lane])
+        for quantile in self.quantiles[lane].values():
+            quantile.add(w)
+        self.waitingTimeHistogram[lane].add(w)
+
+    def registerWaitingTimes(self, ws, lane):
+        ws = np.asarray(ws, dtype=float)
+        if len(ws) == 0:
+            return
+        if self.keepWaitingTimes:
+            self.waitingTimes[lane].extend(ws.tolist())
+        # combine the batch with what we had, as in Chan et al.
+        n, nB = self.nW[lane], len(ws)
+        meanB = float(ws.mean())
+        delta = meanB - self.meanW[lane]
+        self.nW[lane] = n + nB
+        self.meanW[lane] += delta * nB / self.nW[lane]
+        self.m2W[lane] += float(np.sum((ws - meanB) ** 2)) + delta * delta * n * nB / self.nW[lane]
+        for quantile in self.quantiles[lane].values():
+            for w in ws.tolist():
+                quantile.add(w)
+        self.waitingTimeHistogram[lane].addMany(ws)
+
+    def merge(self, other):
+        """Add the statistics of other to these. Means, variances (as in Chan et al.) and
+        histograms are combined exactly. The P^2 quantile markers cannot be combined, so
+        once a lane holds the waiting times of two runs its quantiles are estimated from
+        the waiting-time histogram (to within a bin, a factor 10**(1/binsPerDecade))."""
+        if type(other) is not type(self) or other.nrLanes != self.nrLanes:
+            raise TypeError('Only results of the same class and number of lanes can be merged')
+        for lane in range(self.nrLanes):
+            self.sumQL[lane] += other.sumQL[lane]
+            self.sumQL2[lane] += other.sumQL2[lane]
+            self.nQ[lane] += other.nQ[lane]
+            self.mergedTime[lane] += other.getObservedTime(lane)
+            hist = self.queueLengthHistogram[lane]
+            for ql, dt in other.queueLengthHistogram[lane].items():
+                hist[ql] = hist.get(ql, 0) + dt
+            n, nB = self.nW[lane], other.nW[lane]
+            if nB == 0:
+                continue
+            if n == 0:
+                self.quantiles[lane] = deepcopy(other.quantiles[lane])
+                self.mergedQuantiles[lane] = other.mergedQuantiles[lane]
+            else:
+                self.mergedQuantiles[lane] = True
+            delta = other.meanW[lane] - self.meanW[lane]
+            self.nW[lane] = n + nB
+            self.meanW[lane] += delta * nB / self.nW[lane]
+            self.m2W[lane] += other.m2W[lane] + delta * delta * n * nB / self.nW[lane]
+            self.waitingTimeHistogram[lane].merge(other.waitingTimeHistogram[lane])
+            if self.keepWaitingTimes and other.keepWaitingTimes:
+                self.waitingTimes[lane].extend(other.waitingTimes[lane])
+        return self
+
+    def state(self, waitingTimes=False):
+        hists = [sorted(hist.items()) for hist in self.queueLengthHistogram]
+        markers = np.full((self.nrLanes, len(self.QUANTILES), 3, 5), np.nan)  # heights, positions, desired positions
+        nrMarkers = np.zeros((self.nrLanes, len(self.QUANTILES)), dtype=int)
+        for lane in range(self.nrLanes):
+            for i, p in enumerate(self.QUANTILES):
+                quantile = self.quantiles[lane][p]
+                nrMarkers[lane, i] = len(quantile.q)
+                markers[lane, i, 0, :len(quantile.q)] = quantile.q
+                markers[lane, i, 1] = quantile.n
+                markers[lane, i, 2] = quantile.desired
+        histogram = self.waitingTimeHistogram[0]
+        state = {'nrLanes': self.nrLanes, 'sumQL': self.sumQL, 'sumQL2': self.sumQL2, 'nQ': self.nQ,
+                 'oldTime': self.oldTime, 'mergedTime': self.mergedTime, 'queueLengthCounts': [len(hist) for hist in hists],
+                 'queueLengths': np.array([ql for hist in hists for ql, _ in hist], dtype=int),
+                 'queueLengthTimes': np.array([dt for hist in hists for _, dt in hist], dtype=float),
+                 'nW': self.nW, 'meanW': self.meanW, 'm2W': self.m2W, 'quantileMarkers': markers,
+                 'nrMarkers': nrMarkers, 'mergedQuantiles': self.mergedQuantiles,
+                 'histogramBins': [histogram.minValue, histogram.binsPerDecade, histogram.nrBins],
+                 'waitingTimeHistogram': [hist.counts for hist in self.waitingTimeHistogram]}
+        if waitingTimes and self.keepWaitingTimes:
+            state['waitingTimeCounts'] = [len(ws) for ws in self.waitingTimes]
+            state['waitingTimes'] = np.concatenate([np.array(ws, dtype=float) for ws in self.waitingTimes])
+        return {key: np.asarray(value) for key, value in state.items()}
+
+    @classmethod
+    def fromState(cls, state):
+        res = cls(int(state['nrLanes']), keepWaitingTimes='waitingTimes' in state)
+        for key in ['sumQL', 'sumQL2', 'oldTime', 'meanW', 'm2W']:
+            setattr(res, key, state[key].astype(float).tolist())
+        if 'mergedTime' in state:
+            res.mergedTime = state['mergedTime'].astype(float).tolist()
+        res.nQ = state['nQ'].astype(int).tolist()
+        res.nW = state['nW'].astype(int).tolist()
+        res.mergedQuantiles = state['mergedQuantiles'].astype(bool).tolist()
+        ends = np.cumsum(state['queueLengthCounts'])
+        starts = ends - state['queueLengthCounts']
+        minValue, binsPerDecade, nrBins = state['histogramBins'].tolist()
+        for lane in range(res.nrLanes):
+            res.queueLengthHistogram[lane] = dict(zip(state['queueLengths'][starts[lane]:ends[lane]].tolist(),
+                                                      state['queueLengthTimes'][starts[lane]:ends[lane]].tolist()))
+            for i, p in enumerate(cls.QUANTILES):
+                quantile = res.quantiles[lane][p]
+                markers = state['quantileMarkers'][lane, i]
+                quantile.q = markers[0, :state['nrMarkers'][lane, i]].tolist()
+                quantile.n = markers[1].astype(int).tolist()
+                quantile.desired = markers[2].tolist()
+            histogram = LogHistogram(minValue, minValue * 10 ** (nrBins / binsPerDecade), int(binsPerDecade))
+            histogram.counts = state['waitingTimeHistogram'][lane].astype(int).tolist()
+            res.waitingTimeHistogram[lane] = histogram
+        if 'waitingTimes' in state:
+            ends = np.cumsum(state['waitingTimeCounts'])
+            for lane in range(res.nrLanes):
+                res.waitingTimes[lane].extend(state['waitingTimes'][ends[lane] - state['waitingTimeCounts'][lane]:ends[lane]].tolist())
+        return res
+
+    def getMeanWaitingTime(self, lane):
+        return self.meanW[lane] if self.nW[lane] > 0 else np.nan
+
+    def getVarianceWaitingTime(self, lane):
+        return self.m2W[lane] / self.nW[lane] if self.nW[lane] > 0 else np.nan
+
+    def getWaitingTimeQuantile(self, p, lane):
+        """Estimate of the p-quantile of the waiting time, p should be one of QUANTILES
+        (any p for a lane that was merged, see merge)"""
+        if self.mergedQuantiles[lane]:
+            return self.waitingTimeHistogram[lane].quantile(p)
+        return self.quantiles[lane][p].value()
+
+    def getQueueLengthHistogram(self, lane):
+        hist = self.queueLengthHistogram[lane]
+        return [hist.get(k, 0) / self.getObservedTime(lane) for k in range(max(hist, default=-1) + 1)]
+
+    def getWaitingTimes(self, lane):
+        if not self.keepWaitingTimes:
+            raise ValueError('The waiting times are not kept, use StreamingSimResults(nrLanes, keepWaitingTimes=True)')
+        return self.waitingTimes[lane]
+
+    def __str__(self):
+        s = SimResults.__str__(self)
+        for p in self.QUANTILES:
+            s += f'{int(100 * p)}% quantile waiting time: ' + str([self.getWaitingTimeQuantile(p, lane) for lane in range(self.nrLanes)]) + '\n'
+        return s
+
+    def histWaitingTimes(self, nrBins=100):
+        if self.keepWaitingTimes:
+            return SimResults.histWaitingTimes(self, nrBins)
+        plt.figure()
+        for lane in range(self.nrLanes):
+            hist = self.waitingTimeHistogram[lane]
+            edges = hist.edges()
+            edges[-1] = edges[-2]                   # the last bin is unbounded, draw it with width 0
+            plt.stairs(hist.density(), edges)
+        plt.xscale('symlog', linthresh=self.waitingTimeHistogram[0].minValue)
+        plt.ylabel('P(W = k)')
+        plt.xlabel('k')
+        plt.legend([f'lane{i}' for i in range(self.nrLanes)])
+        plt.show()
+
+
+RESULT_CLASSES = {'SimResults': SimResults, 'StreamingSimResults': StreamingSimResults}
+
+
+def loadResults(path):
+    """Results stored with save"""
+    with np.load(path) as f:
+        state = dict(f)
+    return RESULT_CLASSES[str(state.pop('kind'))].fromState(state)
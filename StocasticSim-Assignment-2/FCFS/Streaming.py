@@ -0,0 +1,100 @@
+from collections import namedtuple
+
+import numpy as np
+
+# a car that left the intersection; as in the traces, the car reaches the intersection at departure - B
+Departure = namedtuple('Departure', ['lane', 'arrival', 'serviceStart', 'waitingTime', 'departure'])
+
+# statistics per lane of the window [start, end): number of departures, mean and largest waiting
+# time of these departures (nan if there were none) and the time-average queue length
+Window = namedtuple('Window', ['start', 'end', 'departures', 'meanWaitingTime', 'maxWaitingTime', 'meanQueueLength'])
+
+
+class WindowCollector:
+    """Statistics of consecutive windows of a given length, for iter_simulate. The queue
+    lengths are integrated exactly up to the window boundaries, so a window only holds
+    what happened within it."""
+
+    def __init__(self, nrLanes, length, start=0.0):
+        self.nrLanes = nrLanes
+        self.length = length
+        self.start = start
+        self.end = start + length
+        self.lastTime = [start] * nrLanes
+        self.reset()
+
+    def reset(self):
+        self.nrDepartures = [0] * self.nrLanes
+        self.sumW = [0.0] * self.nrLanes
+        self.maxW = [-np.inf] * self.nrLanes
+        self.sumQL = [0.0] * self.nrLanes
+
+    def queueLength(self, lane, t, ql):
+        """The queue length of lane was ql from its previous change until t"""
+        self.sumQL[lane] += ql * (t - self.lastTime[lane])
+        self.lastTime[lane] = t
+
+    def departure(self, record):
+        lane = record.lane
+        self.nrDepartures[lane] += 1
+        self.sumW[lane] += record.waitingTime
+        self.maxW[lane] = max(self.maxW[lane], record.waitingTime)
+
+    def close(self, queueLengths, end=None):
+        """Window record of the current window, which ends at end (by default its regular end);
+        queueLengths are the queue lengths of the lanes at that moment"""
+        end = self.end if end is None else end
+        for lane, ql in enumerate(queueLengths):
+            self.queueLength(lane, end, ql)
+        duration = end - self.start
+        window = Window(self.start, end, self.nrDepartures,
+                        [s / n if n > 0 else np.nan for s, n in zip(self.sumW, self.nrDepartures)],
+                        [w if n > 0 else np.nan for w, n in zip(self.maxW, self.nrDepartures)],
+                        [s / duration if duration > 0 else np.nan for s in self.sumQL])
+        self.start, self.end = end, end + self.length
+        self.reset()
+        return window
+
+
+if __name__ == '__main__':
+    import os
+    import sys
+
+    from BunchedExponential import BunchedExpSampler
+    from FCFSSimulation import FCFSSimulation
+    from Streaming import Window                    # the class the simulation yields, not the one of __main__
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # for the Trajectories package
+    from Trajectories.occupancy import OccupancyGrid
+    from Trajectories.trajectory import trajectory_times
+
+    # alpha and mu were determined before, using the estimateParameters() function
+    alpha0, alpha1, mu0, mu1 = 0.5995995995995996, 0.5725725725725725, 0.21564291046984274, 0.3102950696782692
+
+    # statistics per 10 minutes, and the space-time occupancy of the lanes built while simulating
+    T, chunkSize = 7200, 500
+    sim = FCFSSimulation(BunchedExpSampler(seed=2023), 2, False, [alpha0, alpha1], [mu0, mu1])
+    grids = [OccupancyGrid(0, T + 600, dt=10) for _ in range(2)]
+    pending = [[] for _ in range(2)]                # departures of a lane that are not in its grid yet
+    last = [(-100, -100)] * 2                       # trajectory times the next chunk of a lane depends on
+
+    def addChunk(lane):
+        arrival = [d.arrival for d in pending[lane]]
+        reach = [d.departure - sim.B for d in pending[lane]]
+        times = trajectory_times(arrival, reach, t_full_y=last[lane][0], start_service_predecessor=last[lane][1])
+        grids[lane].add(times)
+        last[lane] = (times[-1, 4], times[-1, 5])
+        pending[lane].clear()
+
+    for record in sim.iter_simulate(T, window=600):
+        if isinstance(record, Window):
+            print(f'{record.start:6.0f}-{record.end:6.0f}: departures {record.departures}, '
+                  f'mean waiting time {np.round(record.meanWaitingTime, 1)}, mean queue length {np.round(record.meanQueueLength, 1)}')
+            continue
+        pending[record.lane].append(record)
+        if len(pending[record.lane]) == chunkSize:
+            addChunk(record.lane)
+    for lane in range(2):
+        if pending[lane]:
+            addChunk(lane)
+        print(f'lane {lane}: {grids[lane].nr_cars} cars, longest queue {grids[lane].max_queue:.0f} m')
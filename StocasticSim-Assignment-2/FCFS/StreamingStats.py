@@ -0,0 +1,113 @@
+from bisect import bisect_right, insort
+from math import floor, log10
+
+import numpy as np
+
+
+class P2Quantile:
+    """Streaming estimate of the p-quantile with the P^2 algorithm of Jain and
+    Chlamtac (1985). Only five markers are kept, so the memory does not depend
+    on the number of observations."""
+
+    def __init__(self, p):
+        self.p = p
+        self.q = []                                          # marker heights
+        self.n = [0, 1, 2, 3, 4]                             # marker positions
+        self.desired = [0, 2 * p, 4 * p, 2 + 2 * p, 4]       # desired marker positions
+        self.increment = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, x):
+        q, n = self.q, self.n
+        if len(q) < 5:
+            insort(q, x)
+            return
+        if x < q[0]:
+            q[0] = x
+        elif x > q[4]:
+            q[4] = x
+        k = min(max(bisect_right(q, x) - 1, 0), 3)          # q[k] <= x < q[k+1]
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increment[i]
+        for i in range(1, 4):                                # adjust the middle markers if needed
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                qp = q[i] + d / (n[i + 1] - n[i - 1]) * ((n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                                                        + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+                if not q[i - 1] < qp < q[i + 1]:             # parabolic prediction out of range, use linear
+                    qp = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = qp
+                n[i] += d
+
+    def value(self):
+        if len(self.q) == 0:
+            return np.nan
+        if len(self.q) < 5:                                  # too few observations for the markers, exact
+            return float(np.quantile(self.q, self.p))
+        return self.q[2]
+
+
+class LogHistogram:
+    """Histogram with logarithmic bins between minValue and maxValue (binsPerDecade
+    bins per factor 10). The first bin holds everything below minValue (such as
+    waiting times of 0) and the last bin everything above maxValue."""
+
+    def __init__(self, minValue=1e-2, maxValue=1e6, binsPerDecade=20):
+        self.minValue = minValue
+        self.binsPerDecade = binsPerDecade
+        self.nrBins = int(round(log10(maxValue / minValue) * binsPerDecade))
+        self.counts = [0] * (self.nrBins + 2)
+
+    def binIndex(self, x):
+        if x < self.minValue:
+            return 0
+        return min(int(floor(log10(x / self.minValue) * self.binsPerDecade)) + 1, self.nrBins + 1)
+
+    def add(self, x):
+        self.counts[self.binIndex(x)] += 1
+
+    def merge(self, other):
+        """Add the counts of another histogram with the same bins"""
+        if (other.minValue, other.binsPerDecade, other.nrBins) != (self.minValue, self.binsPerDecade, self.nrBins):
+            raise ValueError('Only histograms with the same bins can be merged')
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        return self
+
+    def quantile(self, p):
+        """p-quantile, interpolated within its bin (logarithmically, linearly in the first bin);
+        in the unbounded last bin the quantile is taken as maxValue"""
+        total = sum(self.counts)
+        if total == 0:
+            return np.nan
+        cumulative = np.cumsum(self.counts)
+        k = min(int(np.searchsorted(cumulative, p * total)), self.nrBins + 1)
+        while self.counts[k] == 0:                           # only for p = 0
+            k += 1
+        edges = self.edges()
+        if k == self.nrBins + 1:
+            return float(edges[-2])
+        fraction = (p * total - (cumulative[k] - self.counts[k])) / self.counts[k]
+        if k == 0:
+            return float(fraction * self.minValue)
+        return float(edges[k] * (edges[k + 1] / edges[k]) ** fraction)
+
+    def addMany(self, xs):
+        xs = np.asarray(xs, dtype=float)
+        index = np.floor(np.log10(np.maximum(xs, self.minValue) / self.minValue) * self.binsPerDecade).astype(int) + 1
+        index = np.where(xs < self.minValue, 0, np.minimum(index, self.nrBins + 1))
+        for i, count in enumerate(np.bincount(index, minlength=self.nrBins + 2).tolist()):
+            self.counts[i] += count
+
+    def edges(self):
+        """Bin edges; the first bin starts at 0 and the last one ends at inf"""
+        inner = self.minValue * 10 ** (np.arange(self.nrBins + 1) / self.binsPerDecade)
+        return np.concatenate(([0], inner, [np.inf]))
+
+    def density(self):
+        """Fraction of the observations per unit of x, for every bin (0 for the unbounded last bin)"""
+        counts = np.array(self.counts, dtype=float)
+        widths = np.diff(self.edges())
+        total = counts.sum()
+        return np.where(np.isfinite(widths), counts / max(total, 1) / widths, 0.0)
@@ -0,0 +1,178 @@
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+import ast
+import hashlib
+import inspect
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from BunchedExponential import BunchedExpSampler
+from FCFSSimulation import FCFSSimulation
+from IntersectionSimulation import IntersectionSimulation
+from OutputAnalysis import confidenceInterval
+from Policies import FCFSPolicy, ExhaustivePolicy, GatedPolicy, KLimitedPolicy, FixedCyclePolicy
+from SimResults import StreamingSimResults
+
+POLICIES = {'FCFS': FCFSPolicy, 'exhaustive': ExhaustivePolicy, 'gated': GatedPolicy,
+            'k-limited': KLimitedPolicy, 'fixed-cycle': FixedCyclePolicy}
+
+# the defaults of a scenario, the parameters of the assignment
+DEFAULT_SCENARIO = {'alpha': (0.5995995995995996, 0.5725725725725725), 'mu': (0.21564291046984274, 0.3102950696782692),
+                    'B': IntersectionSimulation.B, 'S': IntersectionSimulation.S, 'policy': 'FCFS'}
+
+
+def codeFiles(name='Sweep.py'):
+    """The file name and the files of this folder it imports, directly or indirectly, in
+    sorted order. The results of a scenario depend on these files, a change in any of
+    them gives new cache keys."""
+    folder = os.path.dirname(os.path.abspath(__file__))
+    files, todo = set(), [name]
+    while todo:
+        name = todo.pop()
+        if name in files:
+            continue
+        files.add(name)
+        with open(os.path.join(folder, name), 'rb') as f:
+            tree = ast.parse(f.read())
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                modules = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module is not None:
+                modules = [node.module]
+            else:
+                continue
+            todo.extend(module + '.py' for module in modules if os.path.exists(os.path.join(folder, module + '.py')))
+    return sorted(files)
+
+
+def codeVersion():
+    h = hashlib.sha256()
+    folder = os.path.dirname(os.path.abspath(__file__))
+    for name in codeFiles():
+        with open(os.path.join(folder, name), 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def makePolicy(spec):
+    """Policy object of a policy spec: a name in POLICIES, or a list [name, arg, ...],
+    like ['k-limited', 3] or ['fixed-cycle', [20, 20], 2]"""
+    name, args = (spec, []) if isinstance(spec, str) else (spec[0], list(spec[1:]))
+    if name not in POLICIES:
+        raise ValueError(f'Unknown policy {name!r}, the policies are {list(POLICIES)}')
+    required = [p.name for p in inspect.signature(POLICIES[name]).parameters.values() if p.default is p.empty]
+    if len(args) < len(required):
+        missing = required[len(args):]
+        raise ValueError(f"{name} needs {', '.join(missing)}: use [{', '.join([repr(name)] + required)}]")
+    return POLICIES[name](*args)
+
+
+def policyLabel(spec):
+    return spec if isinstance(spec, str) else ' '.join(str(x) for x in spec)
+
+
+def scenarioGrid(**axes):
+    """All combinations of the values of the given parameters (alpha, mu, B, S, policy),
+    the other parameters get their value in DEFAULT_SCENARIO. For example
+    scenarioGrid(S=[2, 2.4, 3], policy=['FCFS', 'exhaustive', ['k-limited', 5]])"""
+    names = list(axes)
+    return [dict(DEFAULT_SCENARIO, **dict(zip(names, values))) for values in product(*axes.values())]
+
+
+def normalize(scenario):
+    """Scenario with all parameters, in a form that is the same after a round trip through JSON"""
+    return json.loads(json.dumps(dict(DEFAULT_SCENARIO, **scenario)))
+
+
+def scenarioKey(scenario, nrLanes, T, n, seed, version):
+    text = json.dumps({'scenario': scenario, 'nrLanes': nrLanes, 'T': T, 'n': n, 'seed': seed, 'code': version},
+                      sort_keys=True)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def simulateScenario(scenario, nrLanes, T, seedSeq, res):
+    """One replication of length T of a scenario, with the random stream seedSeq; the
+    results are collected in res"""
+    policy = makePolicy(scenario['policy'])
+    fast = isinstance(policy, FCFSPolicy)          # FCFS can use simulate_fast, same results, much faster
+    sampler = BunchedExpSampler(seed=seedSeq)
+    if fast:
+        sim = FCFSSimulation(sampler, nrLanes, False, scenario['alpha'], scenario['mu'])
+    else:
+        sim = IntersectionSimulation(sampler, nrLanes, False, scenario['alpha'], scenario['mu'], policy)
+    sim.B, sim.S = scenario['B'], scenario['S']     # instance attributes, instead of the class defaults
+    sampler.setParameters(scenario['alpha'], scenario['mu'], scenario['B'])
+    if fast:
+        return sim.simulate_fast(T, res)
+    return sim.simulate(T, res)
+
+
+def runScenario(scenario, nrLanes, T, n, seed):
+    """Perform n replications of a scenario, replication i gets the i-th stream of
+    SeedSequence(seed), and summarise them per lane (a list of dicts, one per lane)"""
+    stats = []
+    for seedSeq in np.random.SeedSequence(seed).spawn(n):
+        res = simulateScenario(scenario, nrLanes, T, seedSeq, StreamingSimResults(nrLanes))
+        stats.append([[res.getMeanWaitingTime(lane), np.sqrt(res.getVarianceWaitingTime(lane)),
+                       res.getWaitingTimeQuantile(0.95, lane), res.getMeanQueueLength(lane)] for lane in range(nrLanes)])
+    stats = np.array(stats, dtype=float)                 # replication x lane x statistic
+    rows = []
+    for lane in range(nrLanes):
+        meanW, halfWidth = confidenceInterval(stats[:, lane, 0])
+        rows.append({'lane': lane, 'meanW': meanW, 'halfWidthW': halfWidth, 'sdW': float(stats[:, lane, 1].mean()),
+                     'p95W': float(stats[:, lane, 2].mean()), 'meanQL': float(stats[:, lane, 3].mean())})
+    return rows
+
+
+def runSweep(scenarios, T, n=1, nrLanes=2, seed=2023, cacheDir='sweep_cache', maxWorkers=None):
+    """Simulate every scenario (a dict as made by scenarioGrid) with n replications of length T.
+
+    The summary of every scenario is stored in cacheDir, under a hash of the scenario,
+    nrLanes, T, n, seed and the code (see codeFiles); scenarios that are in the cache
+    are not simulated again. The other scenarios are divided over a process pool
+    (maxWorkers=1 runs them in this process). All scenarios use the same seed, so they
+    are compared with common random numbers.
+
+    Returns a pandas DataFrame with one row per scenario and lane, with the parameters
+    of the lane and the mean waiting time (with the half-width of its 95% confidence
+    interval if n > 1), the standard deviation and 95% quantile of the waiting time
+    and the mean queue length, averaged over the replications."""
+    os.makedirs(cacheDir, exist_ok=True)
+    version = codeVersion()
+    scenarios = [normalize(scenario) for scenario in scenarios]
+    keys = [scenarioKey(scenario, nrLanes, T, n, seed, version) for scenario in scenarios]
+    paths = {key: os.path.join(cacheDir, key + '.json') for key in keys}
+    todo = {key: scenario for key, scenario in zip(keys, scenarios) if not os.path.exists(paths[key])}
+
+    def store(key, rows):
+        with open(paths[key] + '.tmp', 'w') as f:
+            json.dump(rows, f)
+        os.replace(paths[key] + '.tmp', paths[key])    # no half-written files in the cache if a sweep is interrupted
+
+    args = ([todo[key] for key in todo], [nrLanes] * len(todo), [T] * len(todo), [n] * len(todo), [seed] * len(todo))
+    if maxWorkers == 1 or len(todo) <= 1:
+        for key, rows in zip(todo, map(runScenario, *args)):
+            store(key, rows)
+    else:
+        with ProcessPoolExecutor(max_workers=maxWorkers) as pool:
+            for key, rows in zip(todo, pool.map(runScenario, *args)):
+                store(key, rows)
+
+    table = []
+    for key, scenario in zip(keys, scenarios):
+        with open(paths[key]) as f:
+            for row in json.load(f):
+                lane = row['lane']
+                table.append({'policy': policyLabel(scenario['policy']), 'alpha': scenario['alpha'][lane],
+                              'mu': scenario['mu'][lane], 'B': scenario['B'], 'S': scenario['S'], 'T': T, 'n': n,
+                              'seed': seed, **row})
+    return pd.DataFrame(table)
+
+
+if __name__ == '__main__':
+    # the policies for a few switch-over times; running it again only simulates new scenarios
+    scenarios = scenarioGrid(S=[2, 2.4, 3], policy=['FCFS', 'exhaustive', 'gated', ['k-limited', 5]])
+    print(runSweep(scenarios, T=20000, n=10).to_string())
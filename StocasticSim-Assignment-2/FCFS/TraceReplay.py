@@ -0,0 +1,86 @@
+import numpy as np
+
+
+class TraceReplay:
+    """Arrival source for recorded arrival times (one sorted list or array per lane).
+
+    The times are copied into arrays and read with a cursor per lane, so the input
+    is never changed and restart() starts again from the beginning of the trace.
+    The simulations call restart() at the start of every run, so every replication
+    replays the same data.
+
+    With bootstrap=True the arrivals are generated instead with a moving block
+    bootstrap of the interarrival times of the trace: blocks of blockLength
+    consecutive interarrival times are drawn at random and glued together. Every
+    replication then gets a new, independent resample of the trace, and it never
+    runs out of arrivals."""
+
+    def __init__(self, arrivals, bootstrap=False, blockLength=20, seed=None, blockSize=4096):
+        self.traces = [np.array(lane, dtype=float) for lane in arrivals]
+        self.nrLanes = len(self.traces)
+        self.gaps = [np.diff(trace, prepend=0.0) for trace in self.traces]  # interarrival times, the first from time 0
+        self.bootstrap = bootstrap
+        self.blockLength = blockLength
+        self.blockSize = blockSize
+        self.seed = seed
+        self.rngs = [np.random.default_rng(s) for s in np.random.SeedSequence(seed).spawn(self.nrLanes)]
+        self.restart()
+
+    def restart(self, seed=None):
+        """Start a new replication; with a seed the bootstrap streams are seeded again"""
+        if seed is not None:
+            self.seed = seed
+            seedSeq = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+            # spawn from a copy: spawn changes a SeedSequence, and with common random numbers the
+            # same seed is given to every policy, which should all get the same resample
+            seedSeq = np.random.SeedSequence(seedSeq.entropy, spawn_key=seedSeq.spawn_key, pool_size=seedSeq.pool_size)
+            self.rngs = [np.random.default_rng(s) for s in seedSeq.spawn(self.nrLanes)]
+        self.cursor = [0] * self.nrLanes
+        if self.bootstrap:
+            self.blocks = [np.empty(0) for _ in range(self.nrLanes)]  # resampled interarrival times
+
+    def resample(self, lane):
+        """Draw blockSize new interarrival times for a lane with the moving block bootstrap"""
+        gaps = self.gaps[lane][1:] if len(self.gaps[lane]) > self.blockLength else self.gaps[lane]
+        length = min(self.blockLength, len(gaps))
+        starts = self.rngs[lane].integers(0, len(gaps) - length + 1, size=-(-self.blockSize // length))
+        self.blocks[lane] = gaps[(starts[:, None] + np.arange(length)).ravel()]
+        self.cursor[lane] = 0
+
+    def exhausted(self, lane):
+        raise ValueError(f'The trace of lane {lane} has no arrivals left; use a shorter horizon or bootstrap=True')
+
+    def nextArrival(self, lane, t):
+        """Arrival time of the next car of a lane, given the arrival time t of the previous one"""
+        if self.bootstrap:
+            if self.cursor[lane] == len(self.blocks[lane]):
+                self.resample(lane)
+            gap = self.blocks[lane][self.cursor[lane]]
+            self.cursor[lane] += 1
+            return t + float(gap)
+        if self.cursor[lane] == len(self.traces[lane]):
+            self.exhausted(lane)
+        self.cursor[lane] += 1
+        return float(self.traces[lane][self.cursor[lane] - 1])
+
+    def arrivalsUntil(self, lane, T, t=0):
+        """All arrival times of a lane after t, up to and including the first one at or after T"""
+        if not self.bootstrap:
+            trace = self.traces[lane]
+            k = np.searchsorted(trace, T, side='left')  # first arrival >= T
+            if k == len(trace):
+                self.exhausted(lane)
+            times = trace[self.cursor[lane]:k + 1]
+            self.cursor[lane] = k + 1
+            return times.copy()
+        parts = []
+        while t < T:
+            if self.cursor[lane] == len(self.blocks[lane]):
+                self.resample(lane)
+            rest = self.blocks[lane][self.cursor[lane]:]
+            arrivals = np.cumsum(np.concatenate(([t], rest)))[1:]
+            k = min(np.searchsorted(arrivals, T, side='left'), len(arrivals) - 1)
+            self.cursor[lane] += k + 1
+            parts.append(arrivals[:k + 1])
+            t = arrivals[k]
+        return np.concatenate(parts) if parts else np.empty(0)
@@ -0,0 +1,165 @@
+import csv
+import os
+import zipfile
+
+import numpy as np
+
+TRACE_DTYPE = np.dtype([('lane', '<i4'), ('arrival', '<f8'), ('service', '<f8')])  # one record per vehicle
+
+
+class TraceSink:
+    """Collects the lane, arrival time and service time of every vehicle in columns
+    in memory, and hands them to the back-end (write) every chunkSize vehicles.
+    Subclasses write the trace as CSV, .npz or raw binary that can be memory-mapped."""
+
+    def __init__(self, path, chunkSize=65536):
+        self.path = path
+        self.chunkSize = chunkSize
+        self.lanes, self.arrivals, self.services = [], [], []
+        self.closed = False
+
+    def record(self, lane, arrival, service):
+        self.lanes.append(lane)
+        self.arrivals.append(arrival)
+        self.services.append(service)
+        if len(self.lanes) >= self.chunkSize:
+            self.flush()
+
+    def recordMany(self, lanes, arrivals, services):
+        self.flush()
+        chunk = np.empty(len(lanes), dtype=TRACE_DTYPE)
+        chunk['lane'], chunk['arrival'], chunk['service'] = lanes, arrivals, services
+        if len(chunk) > 0:
+            self.write(chunk)
+
+    def flush(self):
+        if len(self.lanes) > 0:
+            chunk = np.empty(len(self.lanes), dtype=TRACE_DTYPE)
+            chunk['lane'], chunk['arrival'], chunk['service'] = self.lanes, self.arrivals, self.services
+            self.lanes, self.arrivals, self.services = [], [], []
+            self.write(chunk)
+
+    def write(self, chunk):
+        raise NotImplementedError
+
+    def __getstate__(self):
+        """For a checkpoint of the simulation: the vehicles in memory are written first,
+        and of a file only the number of bytes written so far is kept"""
+        self.flush()
+        state = self.__dict__.copy()
+        if 'file' in state:
+            self.file.flush()
+            state['file'] = self.file.tell()
+            state.pop('writer', None)
+        return state
+
+    def close(self):
+        if not self.closed:
+            self.flush()
+            self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CSVTraceSink(TraceSink):
+    """Trace as a CSV file with the columns Lane, Arrival, Service"""
+
+    def __init__(self, path, chunkSize=65536):
+        TraceSink.__init__(self, path, chunkSize)
+        self.file = open(path, 'w', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(['Lane', 'Arrival', 'Service'])
+
+    def write(self, chunk):
+        self.writer.writerows(zip(chunk['lane'].tolist(), chunk['arrival'].tolist(), chunk['service'].tolist()))
+        self.file.flush()
+
+    def __setstate__(self, state):
+        """Continue the file of a checkpoint, without what was written after it"""
+        self.__dict__.update(state)
+        self.file = open(self.path, 'r+', newline='')
+        self.file.truncate(state['file'])
+        self.file.seek(state['file'])
+        self.writer = csv.writer(self.file)
+
+    def close(self):
+        if not self.closed:
+            TraceSink.close(self)
+            self.file.close()
+
+
+class NpzTraceSink(TraceSink):
+    """Trace as a .npz file that holds every chunk as its own array (chunk000000, ...);
+    readTrace combines them. A chunk is added to the archive as soon as it is written."""
+
+    def __init__(self, path, chunkSize=65536):
+        TraceSink.__init__(self, path, chunkSize)
+        self.nrChunks = 0
+        zipfile.ZipFile(path, 'w').close()
+
+    def write(self, chunk):
+        with zipfile.ZipFile(self.path, 'a') as archive:
+            with archive.open(f'chunk{self.nrChunks:06d}.npy', 'w', force_zip64=True) as f:
+                np.lib.format.write_array(f, chunk)
+        self.nrChunks += 1
+
+    def __setstate__(self, state):
+        """Continue the archive of a checkpoint, without the chunks written after it"""
+        self.__dict__.update(state)
+        with zipfile.ZipFile(self.path) as archive:
+            names = sorted(archive.namelist())
+            if len(names) == self.nrChunks:
+                return
+            with zipfile.ZipFile(self.path + '.tmp', 'w') as kept:
+                for name in names[:self.nrChunks]:
+                    kept.writestr(archive.getinfo(name), archive.read(name))
+        os.replace(self.path + '.tmp', self.path)
+
+
+class MemmapTraceSink(TraceSink):
+    """Trace as raw records of TRACE_DTYPE, appended chunk by chunk; readTrace memory-maps it"""
+
+    def __init__(self, path, chunkSize=65536):
+        TraceSink.__init__(self, path, chunkSize)
+        self.file = open(path, 'wb')
+
+    def write(self, chunk):
+        chunk.tofile(self.file)
+        self.file.flush()
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.file = open(self.path, 'r+b')
+        self.file.truncate(state['file'])
+        self.file.seek(state['file'])
+
+    def close(self):
+        if not self.closed:
+            TraceSink.close(self)
+            self.file.close()
+
+
+def readTrace(path):
+    """Read a trace written by one of the sinks (the format follows from the extension:
+    .csv, .npz, anything else is raw binary). Returns a record array with the fields
+    lane, arrival and service; a raw binary trace is memory-mapped, not read."""
+    if path.endswith('.csv'):
+        data = np.loadtxt(path, delimiter=',', skiprows=1, ndmin=2)
+        trace = np.empty(len(data), dtype=TRACE_DTYPE)
+        trace['lane'], trace['arrival'], trace['service'] = data[:, 0], data[:, 1], data[:, 2]
+    elif path.endswith('.npz'):
+        with np.load(path) as data:
+            if 'lane' in data.files:                        # the arrays lane, arrival and service
+                trace = np.empty(len(data['lane']), dtype=TRACE_DTYPE)
+                for name in TRACE_DTYPE.names:
+                    trace[name] = data[name]
+            else:
+                chunks = [data[name] for name in sorted(data.files)]
+                trace = np.concatenate(chunks) if chunks else np.empty(0, dtype=TRACE_DTYPE)
+    else:
+        trace = np.memmap(path, dtype=TRACE_DTYPE, mode='r')
+    return trace.view(np.recarray)
@@ -0,0 +1,15 @@
+import numpy as np
+
+from Comparison import comparePolicies, pairedDifferenceCI
+from FCFSSimulation import FCFSSimulation
+from TraceReplay import TraceReplay
+
+
+def test_identical_policies_have_no_difference_under_crn():
+    rng = np.random.default_rng(1)
+    arrivals = TraceReplay([np.cumsum(rng.exponential(4.0, 500)) for _ in range(2)], bootstrap=True)
+    meanW, meanQL = comparePolicies(2, 3000, 4, arrivals=arrivals, simClasses=(FCFSSimulation, FCFSSimulation),
+                                    seed=2023, crn=True, maxWorkers=1)
+    assert np.array_equal(meanW[0], meanW[1])
+    assert np.array_equal(meanQL[0], meanQL[1])
+    assert all(difference == 0 for difference, _ in pairedDifferenceCI(meanW))
@@ -0,0 +1,67 @@
+import numpy as np
+
+from BunchedExponential import BunchedExpSampler
+from FCFSSimulation import FCFSSimulation
+from Replications import runReplications
+from SimResults import SimResults
+from TraceReplay import TraceReplay
+
+# alpha and mu were determined before, using the estimateParameters() function
+ALPHA = [0.5995995995995996, 0.5725725725725725]
+MU = [0.21564291046984274, 0.3102950696782692]
+
+
+def test_simulate_batch_matches_replications():
+    sim = FCFSSimulation(BunchedExpSampler(), 2, False, ALPHA, MU)
+    meanW, meanQL = sim.simulate_batch(1000, 8, seed=2023)
+    refW, refQL = runReplications(FCFSSimulation, 2, 1000, 8, ALPHA, MU, seed=2023, maxWorkers=1)
+    assert np.allclose(meanW, refW)
+    assert np.allclose(meanQL, refQL)
+    for r, seedSeq in enumerate(np.random.SeedSequence(2023).spawn(8)):   # the same streams as simulate_fast
+        res = FCFSSimulation(BunchedExpSampler(seed=seedSeq), 2, False, ALPHA, MU).simulate_fast(1000)
+        assert np.allclose(meanW[:, r], [res.getMeanWaitingTime(lane) for lane in range(2)])
+        assert np.allclose(meanQL[:, r], [res.getMeanQueueLength(lane) for lane in range(2)])
+
+
+class QueueLengthSeries(SimResults):
+    """SimResults that also keeps every (time, queue length) pair it is given"""
+
+    def __init__(self, nrLanes):
+        SimResults.__init__(self, nrLanes)
+        self.series = [[] for _ in range(nrLanes)]
+
+    def registerQueueLength(self, time, ql, lane):
+        SimResults.registerQueueLength(self, time, ql, lane)
+        self.series[lane].append((time, ql))
+
+    def registerQueueLengths(self, times, qls, lane):
+        SimResults.registerQueueLengths(self, times, qls, lane)
+        self.series[lane].extend(zip(np.asarray(times).tolist(), np.asarray(qls).tolist()))
+
+
+def assertSameRun(makeSim, T):
+    slow = makeSim().simulate(T, QueueLengthSeries(2))
+    fast = makeSim().simulate_fast(T, QueueLengthSeries(2))
+    for lane in range(2):
+        assert slow.nW[lane] == fast.nW[lane] and slow.nQ[lane] == fast.nQ[lane]
+        assert np.allclose(list(slow.waitingTimes[lane]), list(fast.waitingTimes[lane]))
+        assert np.isclose(slow.sumQL[lane], fast.sumQL[lane])
+        # the queue length that held until each event time; events at the same time
+        # (an arrival exactly when a car departs) may be registered in another order
+        series = []
+        for res in (slow, fast):
+            times, qls = np.array(res.series[lane]).T
+            first = np.concatenate(([True], times[1:] != times[:-1]))
+            series.append((times[first], qls[first]))
+        assert np.allclose(series[0][0], series[1][0])
+        assert np.array_equal(series[0][1], series[1][1])
+
+
+def test_simulate_fast_matches_simulate_with_sampler():
+    assertSameRun(lambda: FCFSSimulation(BunchedExpSampler(seed=7), 2, False, ALPHA, MU), 5000)
+
+
+def test_simulate_fast_matches_simulate_with_trace():
+    rng = np.random.default_rng(3)
+    trace = [np.cumsum(rng.exponential(3.0, 3000)) for _ in range(2)]
+    assertSameRun(lambda: FCFSSimulation(TraceReplay(trace), 2, True), 5000)
@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+
+from BunchedExponential import BunchedExpSampler
+from FCFSSimulation import FCFSSimulation
+from OutputAnalysis import sequentialRun
+from TraceReplay import TraceReplay
+
+
+def test_sequential_run_with_bootstrap_continues_the_shorter_run():
+    rng = np.random.default_rng(5)
+    arrivals = TraceReplay([np.cumsum(rng.exponential(4.0, 500)) for _ in range(2)], bootstrap=True)
+    sim = FCFSSimulation(arrivals, 2, True)
+    short, T, _ = sequentialRun(sim, 2000, relPrecision=np.inf)
+    shortW = [list(short.getWaitingTimes(lane)) for lane in range(2)]
+    long, _, _ = sequentialRun(sim, 2 * T, relPrecision=np.inf)
+    for lane in range(2):
+        assert list(long.getWaitingTimes(lane))[:len(shortW[lane]) - 1] == shortW[lane][:-1]
+
+
+@pytest.mark.parametrize('seed', [None, np.random.default_rng(5)])
+def test_sequential_run_with_sampler_continues_the_shorter_run(seed):
+    sim = FCFSSimulation(BunchedExpSampler(seed=seed), 2, False, [0.6, 0.6], [0.3, 0.3])
+    short, T, _ = sequentialRun(sim, 2000, relPrecision=np.inf)
+    shortW = [list(short.getWaitingTimes(lane)) for lane in range(2)]
+    long, _, _ = sequentialRun(sim, 2 * T, relPrecision=np.inf)
+    for lane in range(2):
+        assert list(long.getWaitingTimes(lane))[:len(shortW[lane]) - 1] == shortW[lane][:-1]
@@ -0,0 +1,12 @@
+import numpy as np
+import pytest
+
+from BunchedExponential import BunchedExpSampler
+
+
+@pytest.mark.parametrize('seed', [None, 7, np.random.SeedSequence(7), np.random.default_rng(7)])
+def test_reset_gives_the_same_streams(seed):
+    sampler = BunchedExpSampler([0.6, 0.5], [0.2, 0.3], seed=seed, blockSize=16)
+    first = [[sampler.sample(lane) for _ in range(40)] for lane in range(2)]
+    sampler.reset()
+    assert [[sampler.sample(lane) for _ in range(40)] for lane in range(2)] == first
@@ -0,0 +1,17 @@
+import pytest
+
+from SimResults import SimResults, StreamingSimResults
+
+
+@pytest.mark.parametrize('cls', [SimResults, StreamingSimResults])
+def test_registering_after_merge_continues_the_own_run(cls):
+    res, other = cls(1), cls(1)
+    res.registerQueueLength(10, 1, 0)
+    other.registerQueueLength(10, 3, 0)
+    res.merge(other)
+    res.registerQueueLength(20, 1, 0)
+    assert res.getObservedTime(0) == 30
+    assert res.getMeanQueueLength(0) == pytest.approx(50 / 30)
+    assert sum(res.getQueueLengthHistogram(0)) == pytest.approx(1)
+    restored = cls.fromState(res.state())
+    assert restored.getMeanQueueLength(0) == pytest.approx(50 / 30)
@@ -0,0 +1,17 @@
+import pytest
+
+from Sweep import codeFiles, makePolicy
+
+
+def test_code_files_include_the_imported_modules():
+    files = codeFiles()
+    for name in ['Sweep.py', 'IntersectionSimulation.py', 'Policies.py', 'TraceReplay.py', 'Streaming.py', 'Event.py', 'FES.py']:
+        assert name in files
+
+
+@pytest.mark.parametrize('spec, message', [('k-limited', "k-limited needs k: use ['k-limited', k]"),
+                                           (['fixed-cycle'], "fixed-cycle needs greenTimes: use ['fixed-cycle', greenTimes]")])
+def test_make_policy_names_the_missing_argument(spec, message):
+    with pytest.raises(ValueError) as error:
+        makePolicy(spec)
+    assert str(error.value) == message
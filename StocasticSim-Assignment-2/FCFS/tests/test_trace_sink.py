@@ -0,0 +1,32 @@
+import pickle
+import zipfile
+
+import numpy as np
+
+from TraceSink import NpzTraceSink, readTrace
+
+
+def test_npz_sink_writes_every_chunk_to_the_archive(tmp_path):
+    path = str(tmp_path / 'trace.npz')
+    sink = NpzTraceSink(path, chunkSize=3)
+    for i in range(7):
+        sink.record(i % 2, float(i), 1.0)
+    with zipfile.ZipFile(path) as archive:
+        assert len(archive.namelist()) == 2             # before closing, only the last vehicle is in memory
+    checkpoint = pickle.dumps(sink)
+    sink.record(1, 7.0, 1.0)
+    sink.close()
+    assert readTrace(path)['arrival'].tolist() == list(range(8))
+
+    resumed = pickle.loads(checkpoint)                  # the chunk written after the checkpoint is dropped
+    resumed.record(0, 9.0, 2.0)
+    resumed.close()
+    trace = readTrace(path)
+    assert trace['arrival'].tolist() == list(range(7)) + [9.0]
+    assert trace['lane'].tolist()[-1] == 0
+
+
+def test_npz_sink_without_vehicles(tmp_path):
+    path = str(tmp_path / 'trace.npz')
+    NpzTraceSink(path).close()
+    assert len(readTrace(path)) == 0
@@ -1,10 +1,11 @@
-from Trajectories.trajectory import Trajectory
+from Trajectories.trajectory import draw_trajectories
 import matplotlib.pyplot as plt
-import pandas as pd
 
 # The following imports are only necessary for plotting the trajectories of the simulations, not the plot_trajectories(...) function itself
 from FCFS.Exhaustive_Simulation import EXHSimulation
-from FCFS.BunchedExponential import BunchedExp
+from FCFS.BunchedExponential import BunchedExpSampler
+from FCFS.TraceSink import MemmapTraceSink, readTrace
+from FCFS.ArrivalData import loadArrivals
 
 
 # Here we are going to plot all trajectories instead of just one.
@@ -20,92 +21,29 @@ def plot_trajectories(arrival_times_0: list, service_start_0: list, arrival_time
     ax.spines['top'].set_color('none')
     ax.spines['right'].set_color('none')
     
-    # Plot trajectories separately for both lanes
-    for lane in [0,1]:
-        if lane == 0:
-            assert len(arrival_times_0) == len(service_start_0), "The number of cars arriving and leaving should be the same"
-            nrCars = len(arrival_times_0)
-            
-            #first trajectory
-            traj = Trajectory(arrival_times_0[0],service_start_0[0])
-            times = traj.calculate_trajectory_times()
-            traj.show_one_trajectory(times, lane=0, single_plot=False)
-            t_full_y = times[4]
-            t_f_y = times[5]
-            
-            #Save road_length for setting the axes:
-            road_length = traj.road_length
-            
-            #all other trajectories
-            for i in range(1,nrCars):
-                traj = Trajectory(arrival_times_0[i],service_start_0[i],t_full_y=t_full_y,start_service_predecessor=t_f_y)
-                times = traj.calculate_trajectory_times()
-                traj.show_one_trajectory(times, lane=0, single_plot=False)
-                t_full_y = times[4]
-                t_f_y = times[5]
-            
-            #save the highest used value of t for setting the axes:
-            max_t_0 = t_f_y
-        elif lane == 1:
-            assert len(arrival_times_1) == len(service_start_1), "The number of cars arriving and leaving should be the same"
-            nrCars = len(arrival_times_1)
-            
-            #first trajectory
-            traj1 = Trajectory(arrival_times_1[0],service_start_1[0])
-            times = traj1.calculate_trajectory_times()
-            traj1.show_one_trajectory(times, lane=1, single_plot=False)
-            t_full_y = times[4]
-            t_f_y = times[5]
-            
-            #all other trajectories
-            for i in range(1,nrCars):
-                traj1 = Trajectory(arrival_times_1[i],service_start_1[i],t_full_y,t_f_y)
-                times = traj1.calculate_trajectory_times()
-                traj1.show_one_trajectory(times, lane=1, single_plot=False)
-                t_full_y = times[4]
-                t_f_y = times[5]
-                
-            #save the highest used value of t for setting the axes:
-            max_t_1 = t_f_y
-    # Here comes the rest of plot preparation, including setting the axes
-    max_t = max(max_t_0, max_t_1)
-    plt.axis([0,max_t,-road_length,road_length])
-    # fig.savefig("Trajectories from distribution.pdf") # uncomment if you want to save the plot
+    # Draw the trajectories of each lane as one collection of lines
+    draw_trajectories(ax, [arrival_times_0, arrival_times_1], [service_start_0, service_start_1])
+    plt.xlim(0, max(service_start_0[-1], service_start_1[-1]))
+    # fig.savefig("Trajectories from distribution.pdf") # uncomment if you want to save the plot, or use render_trajectories
     plt.show()
     
 
 ### Here we make the plots that are asked in the assignment.
 
 ## First the case with data
-df = pd.read_excel(r'C:\Users\20193986\OneDrive - TU Eindhoven\TUe\2022-2023\_Q3\2WB50 Stochastic simulation\Assignment 2\StocasticSim-Assignment-2\arrivals5.xlsx', header=None)
+arrDist = loadArrivals()  # arrival times of both lanes in arrivals5.xlsx
 
-df.columns = [0,1]
-lane0 = df[0].tolist()
-lane1 = df[1].tolist()
+with MemmapTraceSink('output_data.bin') as trace:
+    sim = EXHSimulation(arrDist, 2, True, trace=trace) # the simulation model, it writes the arrival and service time of every car to the trace
+    res = sim.simulate(300)  # perform simulation 
 
-arrDist = [lane0, lane1]
 
-sim = EXHSimulation(arrDist, 2, True) # the simulation model
-res = sim.simulate(300)  # perform simulation 
-
-
-# now that the simulation is finished, we read the data and convert them in such a way that the function above can be used to depict the trajectories
-df_output = pd.read_csv(r'C:\Users\20193986\OneDrive - TU Eindhoven\TUe\2022-2023\_Q3\2WB50 Stochastic simulation\Assignment 2\StocasticSim-Assignment-2\output_data.csv')
-
-# prepare the lists
-arrival_times_0 = []
-service_start_0 = []
-arrival_times_1 = []
-service_start_1 = []
-
-# fill the lists with the correct values
-for car in range(100):
-    if df_output.at[car,'Lane'] == 0:
-        arrival_times_0.append(round(df_output.at[car, 'Arrival'],10)) 
-        service_start_0.append(round(df_output.at[car, 'Service'],10))
-    elif df_output.at[car,'Lane'] == 1: # the car is in lane 1
-        arrival_times_1.append(round(df_output.at[car, 'Arrival'],10))
-        service_start_1.append(round(df_output.at[car, 'Service'],10))
+# now that the simulation is finished, we read the trace (memory-mapped) and split the first 100 cars by lane
+cars = readTrace('output_data.bin')[:100]
+arrival_times_0 = cars.arrival[cars.lane == 0].round(10).tolist()
+service_start_0 = cars.service[cars.lane == 0].round(10).tolist()
+arrival_times_1 = cars.arrival[cars.lane == 1].round(10).tolist()
+service_start_1 = cars.service[cars.lane == 1].round(10).tolist()
 
 # The input for show_trajectories(...) is prepared, now we can run the function
 plot_trajectories(arrival_times_0, service_start_0, arrival_times_1, service_start_1)
@@ -116,28 +54,19 @@ plot_trajectories(arrival_times_0, service_start_0, arrival_times_1, service_sta
 # alpha and mu were determined before, using the estimateParameters() function
 alpha0, alpha1, mu0, mu1 = 0.5995995995995996, 0.5725725725725725, 0.21564291046984274, 0.3102950696782692
 
-arrDist = [BunchedExp, BunchedExp] # interarrival time distr. for each lane
-sim = EXHSimulation(arrDist, 2, False, [alpha0, alpha1], [mu0, mu1]) # the simulation model
-res = sim.simulate(1000)  # perform simulation. We only need the first 100 cars so a sim length of 1000 should be enough
+arrDist = BunchedExpSampler(seed=2023) # interarrival time distr. for each lane, seeded so the run can be reproduced
+with MemmapTraceSink('output.bin') as trace:
+    sim = EXHSimulation(arrDist, 2, False, [alpha0, alpha1], [mu0, mu1], trace=trace) # the simulation model
+    res = sim.simulate(1000)  # perform simulation. We only need the first 100 cars so a sim length of 1000 should be enough
 print(res)  # print the results
 
-# now that the simulation is finished, we read the data and convert them in such a way that the function above can be used to depict the trajectories
-df_output = pd.read_csv(r'C:\Users\20193986\OneDrive - TU Eindhoven\TUe\2022-2023\_Q3\2WB50 Stochastic simulation\Assignment 2\StocasticSim-Assignment-2\output.csv')
-
-# prepare the lists
-arrival_times_0 = []
-service_start_0 = []
-arrival_times_1 = []
-service_start_1 = []
-
-# fill the lists with the correct values
-for car in range(100):
-    if df_output.at[car,'Lane'] == 0:
-        arrival_times_0.append(round(df_output.at[car, 'Arrival'],8)) # there are sometimes rounding errors in the output, which cause errors because a car is served 3e-12 seconds before it arrives
-        service_start_0.append(round(df_output.at[car, 'Service'],8))
-    elif df_output.at[car,'Lane'] == 1: # the car is in lane 1
-        arrival_times_1.append(round(df_output.at[car, 'Arrival'],8))
-        service_start_1.append(round(df_output.at[car, 'Service'],8))
+# now that the simulation is finished, we read the trace (memory-mapped) and split the first 100 cars by lane
+# the times are rounded, because there are sometimes rounding errors in the output, which cause errors because a car is served 3e-12 seconds before it arrives
+cars = readTrace('output.bin')[:100]
+arrival_times_0 = cars.arrival[cars.lane == 0].round(8).tolist()
+service_start_0 = cars.service[cars.lane == 0].round(8).tolist()
+arrival_times_1 = cars.arrival[cars.lane == 1].round(8).tolist()
+service_start_1 = cars.service[cars.lane == 1].round(8).tolist()
 
 # The input for show_trajectories(...) is prepared, now we can run the function
 plot_trajectories(arrival_times_0, service_start_0, arrival_times_1, service_start_1)
@@ -0,0 +1,100 @@
+import numpy as np
+
+from Trajectories.trajectory import trajectory_times, trajectory_positions
+
+
+class OccupancyGrid:
+    ''' Space-time occupancy of one lane: the mean number of vehicles in every
+    (time bin x distance bin) cell, with time bins of dt seconds from t_start to
+    t_end and distance bins of dx metres from the intersection back to
+    road_length + upstream metres (the part beyond road_length shows spillback).
+    The grid is filled from the trajectory times of the cars (as returned by
+    trajectory_times) with add, a chunk of cars at a time, so the memory only
+    depends on the size of the grid and the chunk. Positions are evaluated with
+    the piecewise quadratic motion model at substeps times per time bin.
+
+    Next to the grid it keeps the mean number of stopped cars per time bin, the
+    total stop delay and total delay of the cars, the number of cars that have
+    to slow down before they reach the road (spillback) and the farthest stop.'''
+
+    def __init__(self, t_start, t_end, dt=1.0, dx=10.0, road_length=300, upstream=300, substeps=4, v_m=13, a_m=3):
+        self.t_start = t_start
+        self.dt = dt
+        self.dx = dx
+        self.road_length = road_length
+        self.substeps = substeps
+        self.v_m = v_m
+        self.a_m = a_m
+        self.nr_time_bins = int(np.ceil((t_end - t_start) / dt))
+        self.nr_distance_bins = int(np.ceil((road_length + upstream) / dx))
+        self.occupancy = np.zeros((self.nr_time_bins, self.nr_distance_bins))  # distance bin 0 is at the intersection
+        self.stopped = np.zeros(self.nr_time_bins)
+        self.nr_cars = 0
+        self.stop_delay = 0.0
+        self.delay = 0.0
+        self.spillback = 0
+        self.max_queue = 0.0        # distance from the intersection of the farthest stop
+
+    def add(self, times):
+        ''' Adds the cars with trajectory times times (an array of shape (N, 6))'''
+        times = np.asarray(times, dtype=float)
+        if len(times) == 0:
+            return
+        T0, T1, T2, T3, T5 = times[:, 0], times[:, 1], times[:, 2], times[:, 3], times[:, 5]
+        self.nr_cars += len(times)
+        self.stop_delay += float(np.sum(T3 - T2))
+        self.delay += float(np.sum(T5 - (T0 + self.road_length/self.v_m)))
+        self.spillback += int(np.sum(T1 < T0))
+        stops = T3 > T2
+        if stops.any():
+            x_stop = trajectory_positions(times[stops], times[stops, 2:3], self.road_length, self.v_m, self.a_m)
+            self.max_queue = max(self.max_queue, float(-x_stop.min()))
+
+        # sample g is at time t_start + (g + 1/2) h; every car is sampled from the moment it is
+        # on the road or slows down before it (whichever is first) until it reaches the intersection
+        h = self.dt / self.substeps
+        nr_samples = self.nr_time_bins * self.substeps
+        first = np.clip(np.ceil((np.minimum(T0, T1) - self.t_start) / h - 0.5), 0, nr_samples).astype(int)
+        last = np.clip(np.ceil((T5 - self.t_start) / h - 0.5), 0, nr_samples).astype(int)   # exclusive
+        counts = np.maximum(last - first, 0)
+        car = np.repeat(np.arange(len(times)), counts)
+        g = first[car] + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        t = self.t_start + (g + 0.5) * h
+
+        x = trajectory_positions(times[car], t[:, None], self.road_length, self.v_m, self.a_m)[:, 0]
+        distance_bin = np.minimum((-x / self.dx).astype(int), self.nr_distance_bins - 1)
+        time_bin = g // self.substeps
+        cells = np.bincount(time_bin * self.nr_distance_bins + distance_bin,
+                            minlength=self.nr_time_bins * self.nr_distance_bins)
+        self.occupancy += cells.reshape(self.nr_time_bins, self.nr_distance_bins) / self.substeps
+        standing = (t >= T2[car]) & (t < T3[car])
+        self.stopped += np.bincount(time_bin[standing], minlength=self.nr_time_bins) / self.substeps
+
+    def time_edges(self):
+        return self.t_start + self.dt * np.arange(self.nr_time_bins + 1)
+
+    def distance_edges(self):
+        return self.dx * np.arange(self.nr_distance_bins + 1)
+
+    def spillback_occupancy(self):
+        ''' Mean number of cars per time bin that are beyond road_length'''
+        return self.occupancy[:, int(np.ceil(self.road_length / self.dx)):].sum(axis=1)
+
+
+def lane_occupancy(arrivals, services, t_start, t_end, chunk_size=10000, **kwargs):
+    ''' OccupancyGrid of every lane, given the arrival and start of service times of the
+    cars of each lane (for example from readTrace). The trajectory times of a lane are
+    computed and added chunk_size cars at a time, so a whole day can be processed with
+    little memory; the other arguments are passed to OccupancyGrid.'''
+    grids = []
+    for arrival, start_service in zip(arrivals, services):
+        grid = OccupancyGrid(t_start, t_end, **kwargs)
+        t_full_y, start_service_predecessor = -100, -100
+        for i in range(0, len(arrival), chunk_size):
+            times = trajectory_times(arrival[i:i + chunk_size], start_service[i:i + chunk_size], grid.road_length,
+                                     grid.v_m, grid.a_m, t_full_y=t_full_y,
+                                     start_service_predecessor=start_service_predecessor)
+            grid.add(times)
+            t_full_y, start_service_predecessor = times[-1, 4], times[-1, 5]
+        grids.append(grid)
+    return grids
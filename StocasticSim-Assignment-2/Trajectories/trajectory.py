@@ -4,6 +4,128 @@ import numpy as np
 B = 1
 linewidth = 0.7
 
+def trajectory_times(arrival, start_service, road_length=300, v_m=13, a_m=3, tol=1e-9, t_full_y=-100, start_service_predecessor=-100):
+    ''' Calculates the trajectory times of all cars of one lane at once. Input
+    are arrays of the original arrival times and the start of service times of
+    the cars, in the order they are served. Returns an array of shape (N, 6),
+    row i holds the times [start of segment, t_decelerate, t_stop, t_accelerate,
+    t_full, start_service] of car i, the same as calculate_trajectory_times.
+
+    A car is in the platoon of its predecessor if it is served B after it (up to
+    tol, for rounding errors); all cars of a platoon reach full speed at the
+    t_full of the first car of the platoon, which is its start of service.
+    t_full_y and start_service_predecessor are those of the car before the
+    first one, to continue its platoon when a lane is processed in chunks.'''
+    arrival = np.asarray(arrival, dtype=float)
+    start_service = np.asarray(start_service, dtype=float)
+    assert len(arrival) == len(start_service), "The number of cars arriving and leaving should be the same"
+    assert np.all(np.diff(start_service) > 0), "A car cannot arrive earlier than its predecessor"
+
+    # segmented scan: every car takes t_full from the first car of its platoon
+    assert len(start_service) == 0 or start_service[0] > start_service_predecessor, "A car cannot arrive earlier than its predecessor"
+    new_platoon = np.abs(np.diff(start_service, prepend=start_service_predecessor) - B) > tol
+    first = np.maximum.accumulate(np.where(new_platoon, np.arange(1, len(start_service) + 1), 0))
+    t_full = np.concatenate(([t_full_y], start_service))[first]    # index 0 is the predecessor
+
+    t_start = arrival - road_length/v_m
+    full_stop = v_m * (start_service - t_start - v_m/a_m) >= road_length
+
+    # full stop, algorithm 4 of Timmerman and Boon
+    t_accelerate_stop = t_full - v_m/a_m
+    t_stop_stop = t_accelerate_stop - (start_service - t_start - v_m/a_m - road_length/v_m)
+    # no full stop: the car decelerates and accelerates for the same amount of time
+    deceleration_time = np.sqrt(np.maximum((start_service - t_start)*v_m - road_length, 0)/a_m)
+    t_accelerate_go = t_full - deceleration_time
+
+    times = np.empty((len(arrival), 6))
+    times[:, 0] = t_start
+    times[:, 3] = np.where(full_stop, t_accelerate_stop, t_accelerate_go)
+    times[:, 2] = np.where(full_stop, t_stop_stop, t_accelerate_go)
+    times[:, 1] = np.where(full_stop, t_stop_stop - v_m/a_m, t_accelerate_go - deceleration_time)
+    times[:, 4] = t_full
+    times[:, 5] = start_service
+    return times
+
+
+def trajectory_positions(times, t, road_length=300, v_m=13, a_m=3):
+    ''' Positions of cars at times t, with the piecewise quadratic motion model.
+    times holds the trajectory times of N cars (as returned by trajectory_times)
+    and t has N rows, row i holds times for car i. The position is -road_length
+    at the start of the segment and 0 at the intersection; before the start of
+    the segment the car drives at full speed, so a car that has to slow down
+    before it reaches the segment (spillback) gets a position below -road_length.'''
+    times = np.asarray(times, dtype=float)
+    T0, T1, T2, T3, T4, T5 = (times[:, [i]] for i in range(6))
+    # the position in each part; with a full stop the car stands still between t_stop and t_accelerate
+    x_stop = -road_length + v_m*(T2 - T0) - (a_m/2)*(T2 - T1)**2
+    parts = [np.clip(t, T1, T2), np.clip(t, T3, T4), np.clip(t, T4, T5)]
+    x = np.where(t <= T1, -road_length + v_m*(t - T0),
+        np.where(t <= T2, -road_length + v_m*(parts[0] - T0) - (a_m/2)*(parts[0] - T1)**2,
+        np.where(t <= T3, x_stop,
+        np.where(t <= T4, (parts[1] - T5)*v_m + (a_m/2)*(parts[1] - T4)**2, (parts[2] - T5)*v_m))))
+    # a car without a full stop has T2 == T3, the stop part then has length 0
+    return x
+
+
+def trajectory_vertices(times, road_length=300, v_m=13, a_m=3, points=20):
+    ''' Turns the trajectory times of N cars (as returned by trajectory_times) into
+    the vertices of their curves at once. Returns an array of shape (N, 2*points+6, 2)
+    with pairs (t, x), x is the position on the road: -road_length at the start
+    of the segment and 0 at the intersection. The straight parts get two
+    vertices each, the deceleration and acceleration parts points vertices.'''
+    times = np.asarray(times, dtype=float)
+    T0, T1, T2, T3, T4, T5 = (times[:, [i]] for i in range(6))
+    u = np.linspace(0, 1, points)
+    t = np.concatenate([T0 + (T1 - T0)*u[[0, -1]], T1 + (T2 - T1)*u, T2 + (T3 - T2)*u[[0, -1]],
+                        T3 + (T4 - T3)*u, T4 + (T5 - T4)*u[[0, -1]]], axis=1)
+    x = trajectory_positions(times, t, road_length, v_m, a_m)
+    return np.stack([t, x], axis=-1)
+
+
+def draw_trajectories(ax, arrivals, services, window=None, max_cars=None, road_length=300, v_m=13, a_m=3,
+                      points=20, colors=None):
+    ''' Draws the trajectories of the cars of any number of lanes on the axes ax,
+    one LineCollection per lane. arrivals[lane] and services[lane] hold the
+    arrival and start of service times of the cars of a lane. Even lanes drive
+    in from below, odd lanes from above.
+
+    With window=(t0, t1) only the cars that are on the road during that window
+    are drawn, and with max_cars at most that many cars per lane (every k-th car).'''
+    from matplotlib.collections import LineCollection
+    if colors is None:
+        colors = plt.rcParams['axes.prop_cycle'].by_key()['color']
+    for lane, (arrival, start_service) in enumerate(zip(arrivals, services)):
+        times = trajectory_times(arrival, start_service, road_length, v_m, a_m)
+        if window is not None:
+            times = times[(times[:, 5] >= window[0]) & (times[:, 0] <= window[1])]
+        if max_cars is not None and len(times) > max_cars:
+            times = times[::-(-len(times) // max_cars)]
+        vertices = trajectory_vertices(times, road_length, v_m, a_m, points)
+        vertices[:, :, 1] *= (-1)**lane         # direction, positive for even lane number, negative for odd lane number
+        ax.add_collection(LineCollection(vertices, colors=colors[lane % len(colors)], linewidths=linewidth,
+                                         label=f'lane {lane}'))
+    ax.autoscale_view()
+    ax.set_ylim(-road_length, road_length)
+    if window is not None:
+        ax.set_xlim(*window)
+    ax.set_xlabel('t')
+
+
+def render_trajectories(path, arrivals, services, window=None, max_cars=None, figsize=(12, 6), dpi=150, **kwargs):
+    ''' Draws the trajectories as draw_trajectories does, without a display (with
+    the Agg backend), and saves them to path; the format follows from the
+    extension, e.g. .png, .pdf or .svg.'''
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(1, 1, 1)
+    ax.spines['top'].set_color('none')
+    ax.spines['right'].set_color('none')
+    draw_trajectories(ax, arrivals, services, window, max_cars, **kwargs)
+    fig.savefig(path, dpi=dpi)
+
+
 class Trajectory:
     ''' An object of this class describes the trajectory of one car. Input for
     initialization is the original arrival time, the scheduled arrival time
@@ -61,9 +183,9 @@ class Trajectory:
         in the order [start of segment, t_decelerate, t_stop,
         t_accelerate, t_full, start_service], speed v_m in m/s, acceleration a_m
         in m/s^2 and the lane.'''
-        assert lane <= 3, "Lane number is above 3"
         road_length = -self.road_length
-        colors = ['b', 'r', 'g', 'c'] # this can handle systems with up to 4 lanes. Since we only need 2, that is enough
+        colors = ['b', 'r', 'g', 'c']
+        lane_color = colors[lane % len(colors)] # the colours repeat for more than 4 lanes
         direction = (-1)**lane # positive for even lane number, negative for odd lane number
         arrival_cr = trajectory_times[0]
         
@@ -87,9 +209,9 @@ class Trajectory:
             shift = (trajectory_times[4]-trajectory_times[5])*self.v_m - self.v_m**2/(2*self.a_m)
             
             # segments 1, 3, 5 are straight lines so we only need to name their start and endpoints
-            plt.plot(trajectory_times[0:2],[direction*road_length,direction*(road_length+self.v_m*(trajectory_times[1]-arrival_cr))], colors[lane],linewidth=linewidth)
-            plt.plot(trajectory_times[2:4],[direction*shift,direction*shift], colors[lane],linewidth=linewidth)
-            plt.plot(trajectory_times[4:],[direction*(shift+self.v_m**2/(2*self.a_m)),0], colors[lane],linewidth=linewidth)
+            plt.plot(trajectory_times[0:2],[direction*road_length,direction*(road_length+self.v_m*(trajectory_times[1]-arrival_cr))], lane_color,linewidth=linewidth)
+            plt.plot(trajectory_times[2:4],[direction*shift,direction*shift], lane_color,linewidth=linewidth)
+            plt.plot(trajectory_times[4:],[direction*(shift+self.v_m**2/(2*self.a_m)),0], lane_color,linewidth=linewidth)
     
             # the other two segments are quadratic functions
             t_deceleration = np.linspace(trajectory_times[1], trajectory_times[2],20)
@@ -98,13 +220,13 @@ class Trajectory:
             x_decelerate = direction*(shift - (self.a_m/2)*(t_deceleration - trajectory_times[2])**2)
             x_accelerate = direction*(shift + (self.a_m/2)*(t_acceleration - trajectory_times[3])**2)
     
-            plt.plot(t_deceleration,x_decelerate, colors[lane],linewidth=linewidth)
-            plt.plot(t_acceleration,x_accelerate, colors[lane],linewidth=linewidth)
+            plt.plot(t_deceleration,x_decelerate, lane_color,linewidth=linewidth)
+            plt.plot(t_acceleration,x_accelerate, lane_color,linewidth=linewidth)
         
         elif not full_stop: # the car makes no full stop
             #segments 1 and 4 (out of 4) are straight lines so we only need their start and endpoints
-            plt.plot(trajectory_times[0:2],[direction*road_length,direction*(road_length+self.v_m*(trajectory_times[1]-arrival_cr))], colors[lane],linewidth=linewidth)
-            plt.plot(trajectory_times[4:],[-direction*(trajectory_times[5]-trajectory_times[4])*self.v_m,0], colors[lane],linewidth=linewidth)
+            plt.plot(trajectory_times[0:2],[direction*road_length,direction*(road_length+self.v_m*(trajectory_times[1]-arrival_cr))], lane_color,linewidth=linewidth)
+            plt.plot(trajectory_times[4:],[-direction*(trajectory_times[5]-trajectory_times[4])*self.v_m,0], lane_color,linewidth=linewidth)
             
             # the other two segments are quadratic functions
             t_deceleration = np.linspace(trajectory_times[1], trajectory_times[2],20)
@@ -113,8 +235,8 @@ class Trajectory:
             x_decelerate = direction*(road_length + self.v_m * (t_deceleration-arrival_cr) - (self.a_m/2)*(t_deceleration - trajectory_times[1])**2)
             x_accelerate = direction*((t_acceleration - trajectory_times[5])*self.v_m + (self.a_m/2)*(t_acceleration - trajectory_times[4])**2)
             
-            plt.plot(t_deceleration,x_decelerate, colors[lane],linewidth=linewidth)
-            plt.plot(t_acceleration,x_accelerate, colors[lane],linewidth=linewidth)
+            plt.plot(t_deceleration,x_decelerate, lane_color,linewidth=linewidth)
+            plt.plot(t_acceleration,x_accelerate, lane_color,linewidth=linewidth)
         else:
             pass
 